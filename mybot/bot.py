@@ -66,11 +66,15 @@ from handlers.main_menu import router as main_menu_router
 try:
     from narrative.handlers import router as narrative_router
     from narrative.admin_handlers import router as admin_narrative_handlers
+    from narrative.metrics import narrative_metrics_scheduler
+    from narrative.narrative_service import NarrativeService
     NARRATIVE_AVAILABLE = True
 except ImportError as e:
     logger.warning(f"Narrative module not available: {e}")
     narrative_router = None
     admin_narrative_handlers = None
+    narrative_metrics_scheduler = None
+    NarrativeService = None
     NARRATIVE_AVAILABLE = False
 
 import combinar_pistas
@@ -157,6 +161,13 @@ async def main() -> None:
         
         session_factory = get_session_factory()
         
+        # Decisiones narrativas anteriores a la columna story_id
+        if NarrativeService is not None:
+            async with session_factory() as session:
+                backfilled = await NarrativeService(session).backfill_decision_story_ids()
+            if backfilled:
+                logger.info(f"story_id rellenado en {backfilled} decisiones narrativas")
+        
         logger.info(f"VIP channel ID: {VIP_CHANNEL_ID}")
         logger.info("Configurando bot...")
 
@@ -250,6 +261,11 @@ async def main() -> None:
             free_channel_cleanup_scheduler(bot, session_factory), 
             "channel_cleanup"
         )
+        if narrative_metrics_scheduler is not None:
+            task_manager.add_task(
+                narrative_metrics_scheduler(session_factory),
+                "narrative_metrics"
+            )
 
         # Iniciar polling
         logger.info("Bot iniciado correctamente. Comenzando polling...")
@@ -63,6 +63,13 @@ class User(Base):
             cascade="all, delete-orphan"
         )
 
+    # Filas de user_achievements; la columna JSON ``achievements`` se conserva
+    # por compatibilidad, de ahí el nombre distinto de la relación
+    unlocked_achievements = relationship(
+        "UserAchievement",
+        viewonly=True,
+    )
+
 
 class Reward(Base):
     """Rewards unlocked by reaching a number of points."""
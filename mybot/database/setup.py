@@ -1,7 +1,7 @@
 # database/setup.py
 import logging
+from sqlalchemy import inspect, text
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
-from sqlalchemy.pool import NullPool
 from .base import Base
 from utils.config import Config
 
@@ -54,6 +54,46 @@ TABLES_ORDER = [
     'trivia_user_answers',
 ]
 
+# Columnas e índices añadidos a tablas ya existentes: create_all no altera
+# tablas creadas, así que se aplican aquí en cada arranque si faltan
+ADDED_COLUMNS = [
+    ('user_decisions', 'story_id'),
+    ('user_decisions', 'fragment_title'),
+    ('user_narrative_states', 'endings_reached'),
+]
+
+ADDED_INDEXES = [
+    ('user_decisions', 'ix_user_decisions_user_recent'),
+    ('user_decisions', 'ix_user_decisions_user_story_recent'),
+]
+
+def _migrate_schema(sync_conn):
+    """Añade columnas e índices nuevos a bases de datos existentes (idempotente)."""
+    inspector = inspect(sync_conn)
+    for table_name, column_name in ADDED_COLUMNS:
+        existing = {column['name'] for column in inspector.get_columns(table_name)}
+        if column_name in existing:
+            continue
+        column = Base.metadata.tables[table_name].c[column_name]
+        column_type = column.type.compile(dialect=sync_conn.dialect)
+        sync_conn.execute(text(f'ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type}'))
+        logger.info(f"Columna {table_name}.{column_name} añadida")
+    for table_name, index_name in ADDED_INDEXES:
+        index = next(i for i in Base.metadata.tables[table_name].indexes if i.name == index_name)
+        index.create(sync_conn, checkfirst=True)
+
+def _pool_options(url: str) -> dict:
+    """Opciones del pool de conexiones persistentes para el motor."""
+    # SQLite en memoria usa StaticPool, que no admite tamaño de pool
+    if url.startswith("sqlite") and ":memory:" in url:
+        return {}
+    return {
+        "pool_size": Config.DB_POOL_SIZE,
+        "max_overflow": Config.DB_MAX_OVERFLOW,
+        # Descarta conexiones caídas antes de entregarlas a una sesión
+        "pool_pre_ping": True,
+    }
+
 async def init_db():
     global _engine
     try:
@@ -62,12 +102,13 @@ async def init_db():
             _engine = create_async_engine(
                 Config.DATABASE_URL, 
                 echo=False, 
-                poolclass=NullPool
+                **_pool_options(Config.DATABASE_URL)
             )
         async with _engine.begin() as conn:
             logger.info("Creando tablas...")
             tables = [Base.metadata.tables[name] for name in TABLES_ORDER]
             await conn.run_sync(lambda sync_conn: Base.metadata.create_all(sync_conn, tables=tables))
+            await conn.run_sync(_migrate_schema)
             logger.info("Tablas creadas exitosamente")
         return _engine
     except Exception as e:
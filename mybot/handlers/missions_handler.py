@@ -1,6 +1,10 @@
+import asyncio
+
 from aiogram import Router, F
 from aiogram.types import CallbackQuery
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import lazyload
 
 from services.mission_service import MissionService
 from database.models import User
@@ -10,26 +14,68 @@ logger = logging.getLogger(__name__)
 
 router = Router()
 
+
 @router.callback_query(F.data == "misiones_disponibles")
-async def show_available_missions(callback: CallbackQuery, session: AsyncSession):
+async def show_available_missions(
+    callback: CallbackQuery,
+    session_factory: async_sessionmaker[AsyncSession],
+):
     """Muestra la lista de misiones disponibles para el usuario."""
     try:
-        await callback.answer("Cargando misiones...", show_alert=False)
+        async with session_factory() as session:
+            missions_text = await _build_missions_text(session, callback.from_user.id)
+    except Exception as e:
+        logger.error("Error showing missions: %s", e, exc_info=True)
+        await callback.answer("❌ Error al cargar las misiones. Intenta nuevamente.", show_alert=True)
+        return
 
-        mission_service = MissionService(session)
-        missions = await mission_service.get_active_missions(user_id=callback.from_user.id)
+    # Sin misiones basta con la alerta del callback: ahorra la edición del mensaje
+    if missions_text is None:
+        await callback.answer("No hay misiones disponibles actualmente.", show_alert=True)
+        return
+
+    # La respuesta al callback y la edición del mensaje son independientes:
+    # se envían a Telegram en paralelo
+    try:
+        await asyncio.gather(
+            callback.answer(),
+            _render_missions(callback, missions_text),
+        )
+    except Exception as e:
+        logger.error("Error answering missions callback: %s", e, exc_info=True)
 
-        if not missions:
-            missions_text = "No hay misiones disponibles actualmente."
-        else:
-            user = await session.get(User, callback.from_user.id)
-            missions_text = "Aquí están tus misiones actuales:\n\n"
-            for m in missions:
-                completed, _ = await mission_service.check_mission_completion_status(user, m)
-                status = "✅" if completed else "❌"
-                missions_text += f"• {m.name} ({m.reward_points} pts) {status}\n"
 
+async def _build_missions_text(session: AsyncSession, user_id: int) -> str | None:
+    """Construye el listado de misiones, o None si no hay ninguna."""
+    # Una sola consulta: la completitud vive en User.missions_completed
+    # y el estado narrativo (selectin por defecto) no se necesita aquí
+    stmt = (
+        select(User)
+        .options(lazyload(User.narrative_state))
+        .where(User.id == user_id)
+    )
+    user = (await session.execute(stmt)).scalar_one_or_none()
+
+    mission_service = MissionService(session)
+    missions = await mission_service.get_active_missions(user_id=user_id, user=user)
+    if not missions:
+        return None
+
+    statuses = await mission_service.get_completion_statuses(user, missions)
+    lines = ["Aquí están tus misiones actuales:", ""]
+    for m in missions:
+        status = "✅" if statuses[m.id] else "❌"
+        lines.append(f"• {m.name} ({m.reward_points} pts) {status}")
+    return "\n".join(lines)
+
+
+async def _render_missions(callback: CallbackQuery, missions_text: str) -> None:
+    """Edita el mensaje con el listado ya construido."""
+    try:
         await callback.message.edit_text(missions_text)
     except Exception as e:
-        logger.error(f"Error showing missions: {e}")
-        await callback.message.edit_text("❌ Error al cargar las misiones. Intenta nuevamente.")
+        logger.error("Error showing missions: %s", e, exc_info=True)
+        try:
+            await callback.message.edit_text("❌ Error al cargar las misiones. Intenta nuevamente.")
+        except Exception:
+            pass
@@ -45,4 +45,9 @@ class UserRegistrationMiddleware(BaseMiddleware):
                 logger.info("Created new user via middleware: %s", user_info.id)
             data.setdefault("user", user)
 
+            # End the lookup transaction so the pooled connection is released
+            # while the handler talks to Telegram. Sessions are created with
+            # expire_on_commit=False, so ``user`` stays loaded.
+            await session.commit()
+
         return await handler(event, data)
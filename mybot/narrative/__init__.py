@@ -4,30 +4,32 @@ Gestiona historias ramificadas, decisiones y progresión narrativa
 """
 from __future__ import annotations
 
-try:
-    from .handlers import router as narrative_router
-    from .models import StoryFragment, UserNarrativeState, UserDecision
-    from .narrative_service import NarrativeService
-    from .story_manager import StoryManager
-    
-    __all__ = [
-        'narrative_router',
-        'StoryFragment',
-        'UserNarrativeState', 
-        'UserDecision',
-        'NarrativeService',
-        'StoryManager'
-    ]
-except ImportError as e:
-    import logging
-    logging.getLogger(__name__).warning(f"Error importing narrative components: {e}")
-    
-    # Fallback exports
-    narrative_router = None
-    StoryFragment = None
-    UserNarrativeState = None
-    UserDecision = None
-    NarrativeService = None
-    StoryManager = None
-    
-    __all__ = []
\ No newline at end of file
+import importlib
+from typing import Any
+
+# Nombre exportado -> (submódulo, atributo). Se importa al primer acceso
+# (PEP 562) para no cargar handlers, modelos y servicios al importar el paquete.
+_LAZY_EXPORTS = {
+    'narrative_router': ('.handlers', 'router'),
+    'StoryFragment': ('.models', 'StoryFragment'),
+    'UserNarrativeState': ('.models', 'UserNarrativeState'),
+    'UserDecision': ('.models', 'UserDecision'),
+    'NarrativeService': ('.narrative_service', 'NarrativeService'),
+    'StoryManager': ('.story_manager', 'StoryManager'),
+}
+
+__all__ = list(_LAZY_EXPORTS)
+
+
+def __getattr__(name: str) -> Any:
+    try:
+        module_name, attr = _LAZY_EXPORTS[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    value = getattr(importlib.import_module(module_name, __name__), attr)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(__all__))
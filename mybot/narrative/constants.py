@@ -49,6 +49,11 @@ MESSAGE_TEMPLATES = {
 # Configuración de caché
 CACHE_TTL = 3600  # 1 hora
 PRELOAD_FRAGMENTS = 3  # Precargar próximos N fragmentos
+STATE_CACHE_TTL = 60  # Segundos que se reutiliza el estado narrativo de un usuario
+STATE_CACHE_MAXSIZE = 10_000  # Usuarios en caché
+
+# Volcado de métricas narrativas en lote
+METRICS_FLUSH_INTERVAL = 2  # Segundos
 
 # Puntos por acciones narrativas
 NARRATIVE_POINTS = {
@@ -19,6 +19,7 @@ else:
         UserNarrativeState = None
 
 from utils.user_roles import is_vip_active
+from .state_cache import state_cache
 
 
 def ensure_narrative_state(func: Callable) -> Callable:
@@ -33,6 +34,10 @@ def ensure_narrative_state(func: Callable) -> Callable:
         else:
             return await func(event, session, *args, **kwargs)
         
+        # Un estado en caché ya existe: no hace falta consultarlo
+        if state_cache.get(user_id) is not None:
+            return await func(event, session, *args, **kwargs)
+        
         # Verificar y crear estado si no existe
         state = await session.get(UserNarrativeState, user_id)
         if not state:
@@ -50,6 +55,7 @@ def ensure_narrative_state(func: Callable) -> Callable:
             )
             session.add(state)
             await session.commit()
+        state_cache.put(state)
         
         return await func(event, session, *args, **kwargs)
     
@@ -69,7 +75,10 @@ def require_vip_for_story(func: Callable) -> Callable:
             return await func(event, session, *args, **kwargs)
         
         # Verificar si está intentando acceder a historia VIP
-        state = await session.get(UserNarrativeState, user_id)
+        state = state_cache.get(user_id)
+        if state is None:
+            db_state = await session.get(UserNarrativeState, user_id)
+            state = state_cache.put(db_state) if db_state else None
         if state and state.active_story == "vip":
             # REF: [utils/user_roles.py] is_vip_active
             if not await is_vip_active(user_id, session):
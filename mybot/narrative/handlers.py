@@ -1,8 +1,10 @@
 """
 Handlers principales del sistema narrativo
 """
+import asyncio
 import logging
-from typing import Optional
+import re
+from typing import Any, Awaitable, Callable, Dict, Optional, Union
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command
@@ -13,6 +15,7 @@ from utils.menu_manager import menu_manager
 from utils.user_roles import is_vip_active, is_admin
 from utils.text_utils import sanitize_text
 from database.models import User
+from database.setup import get_session_factory
 from .narrative_service import NarrativeService
 from .decorators import ensure_narrative_state, require_vip_for_story, track_narrative_action
 from .keyboards import NarrativeKeyboards
@@ -22,6 +25,9 @@ from .schemas import FragmentSchema
 logger = logging.getLogger(__name__)
 router = Router()
 
+# Referencias a tareas en segundo plano hasta que terminan (evita que el GC las corte)
+_background_tasks: set = set()
+
 
 @router.message(Command("historia"))
 @ensure_narrative_state
@@ -31,7 +37,7 @@ async def narrative_command(message: Message, session: AsyncSession):
     service = NarrativeService(session)
     
     # Verificar si tiene historia activa
-    state = await service.get_user_state(user_id)
+    state = await service.get_state_snapshot(user_id)
     has_active_story = state and state.current_fragment_id is not None
     
     # Verificar si es VIP
@@ -63,14 +69,13 @@ async def narrative_command(message: Message, session: AsyncSession):
     )
 
 
-@router.callback_query(F.data == "narrative_menu")
 @ensure_narrative_state
 async def narrative_menu(callback: CallbackQuery, session: AsyncSession):
     """Muestra el menú principal de narrativa"""
     user_id = callback.from_user.id
     service = NarrativeService(session)
     
-    state = await service.get_user_state(user_id)
+    state = await service.get_state_snapshot(user_id)
     has_active_story = state and state.current_fragment_id is not None
     is_vip = await is_vip_active(user_id, session)
     
@@ -91,7 +96,6 @@ async def narrative_menu(callback: CallbackQuery, session: AsyncSession):
     await callback.answer()
 
 
-@router.callback_query(F.data == "narrative_continue")
 @ensure_narrative_state
 @require_vip_for_story
 @track_narrative_action("continue_story", 0)
@@ -110,7 +114,6 @@ async def continue_story(callback: CallbackQuery, session: AsyncSession):
     await callback.answer()
 
 
-@router.callback_query(F.data == "narrative_new_story")
 @ensure_narrative_state
 async def new_story_menu(callback: CallbackQuery, session: AsyncSession):
     """Muestra el menú de selección de historia"""
@@ -136,7 +139,6 @@ async def new_story_menu(callback: CallbackQuery, session: AsyncSession):
     await callback.answer()
 
 
-@router.callback_query(F.data == "narrative_select_free")
 @ensure_narrative_state
 @track_narrative_action("start_free_story", 1.0)
 async def select_free_story(callback: CallbackQuery, session: AsyncSession):
@@ -166,7 +168,6 @@ async def select_free_story(callback: CallbackQuery, session: AsyncSession):
     await callback.answer("¡Historia iniciada!")
 
 
-@router.callback_query(F.data == "narrative_select_vip")
 @ensure_narrative_state
 @require_vip_for_story
 @track_narrative_action("start_vip_story", 2.0)
@@ -197,7 +198,6 @@ async def select_vip_story(callback: CallbackQuery, session: AsyncSession):
     await callback.answer("¡Historia VIP iniciada!")
 
 
-@router.callback_query(F.data.startswith("narrative_choice_"))
 @ensure_narrative_state
 @require_vip_for_story
 @track_narrative_action("make_choice", 1.0)
@@ -231,17 +231,12 @@ async def process_choice(callback: CallbackQuery, session: AsyncSession):
     
     # Mostrar nuevo fragmento
     await _display_fragment(callback, fragment, service, session)
+    await callback.answer()
     
-    # Verificar logros
-    achievements = await service.check_achievements(user_id)
-    if achievements:
-        achievement_text = "\n".join([f"🏆 {a.name}" for a in achievements])
-        await callback.answer(f"¡Nuevos logros!\n{achievement_text}", show_alert=True)
-    else:
-        await callback.answer()
+    # Verificar logros fuera del camino de respuesta
+    _schedule_achievement_check(callback)
 
 
-@router.callback_query(F.data.startswith("narrative_next_"))
 @ensure_narrative_state
 @require_vip_for_story
 @track_narrative_action("continue_fragment", 0.5)
@@ -260,7 +255,6 @@ async def next_fragment(callback: CallbackQuery, session: AsyncSession):
     await callback.answer()
 
 
-@router.callback_query(F.data == "narrative_back")
 @ensure_narrative_state
 async def go_back(callback: CallbackQuery, session: AsyncSession):
     """Retrocede al fragmento anterior"""
@@ -277,8 +271,80 @@ async def go_back(callback: CallbackQuery, session: AsyncSession):
     await callback.answer("Has retrocedido")
 
 
+# Despacho de callbacks narrativos
+#
+# Un único handler registrado atiende todos los callbacks "narrative_*": los
+# valores fijos se resuelven con una búsqueda en diccionario y los que llevan
+# parámetros con una sola expresión regular, en lugar de evaluar un filtro
+# por handler en cada actualización.
+
+NarrativeCallbackHandler = Callable[[CallbackQuery, AsyncSession], Awaitable[Any]]
+
+_EXACT_CALLBACKS: Dict[str, NarrativeCallbackHandler] = {
+    "narrative_menu": narrative_menu,
+    "narrative_continue": continue_story,
+    "narrative_new_story": new_story_menu,
+    "narrative_select_free": select_free_story,
+    "narrative_select_vip": select_vip_story,
+    "narrative_back": go_back,
+}
+
+_PARAM_CALLBACKS: Dict[str, NarrativeCallbackHandler] = {
+    "choice": process_choice,
+    "next": next_fragment,
+}
+
+_PARAM_CALLBACK_RE = re.compile(r"^narrative_(?P<action>choice|next)_.+$")
+
+
+def _resolve_narrative_callback(callback: CallbackQuery) -> Union[bool, Dict[str, Any]]:
+    """Filtro que resuelve el handler narrativo para el callback_data"""
+    data = callback.data or ""
+    handler = _EXACT_CALLBACKS.get(data)
+    if handler is None:
+        match = _PARAM_CALLBACK_RE.match(data)
+        if match:
+            handler = _PARAM_CALLBACKS[match.group("action")]
+    if handler is None:
+        # Dejar pasar el callback a otros routers
+        return False
+    return {"narrative_handler": handler}
+
+
+@router.callback_query(F.data.startswith("narrative_"), _resolve_narrative_callback)
+async def dispatch_narrative_callback(
+    callback: CallbackQuery,
+    session: AsyncSession,
+    narrative_handler: NarrativeCallbackHandler
+):
+    """Ejecuta el handler narrativo resuelto por el filtro"""
+    await narrative_handler(callback, session)
+
+
 # Funciones auxiliares
 
+def _schedule_achievement_check(callback: CallbackQuery) -> None:
+    """Lanza la verificación de logros en segundo plano"""
+    task = asyncio.create_task(
+        _check_achievements_in_background(callback.bot, callback.from_user.id)
+    )
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+async def _check_achievements_in_background(bot, user_id: int) -> None:
+    """Verifica logros con su propia sesión y avisa al usuario si hay nuevos"""
+    try:
+        # Sesión propia: la del handler se cierra al terminar la actualización
+        async with get_session_factory()() as session:
+            achievements = await NarrativeService(session).check_achievements(user_id)
+        if achievements:
+            achievement_text = "\n".join([f"🏆 {a.name}" for a in achievements])
+            await bot.send_message(user_id, f"¡Nuevos logros!\n{achievement_text}")
+    except Exception as e:
+        logger.error("Error checking narrative achievements for %s: %s", user_id, e, exc_info=True)
+
+
 async def _display_fragment(
     callback: CallbackQuery,
     fragment: Optional[FragmentSchema],
@@ -291,7 +357,7 @@ async def _display_fragment(
         return
     
     user_id = callback.from_user.id
-    state = await service.get_user_state(user_id)
+    state = await service.get_state_snapshot(user_id)
     
     # Construir texto del fragmento
     text = ""
@@ -319,7 +385,7 @@ async def _display_fragment(
     }
     
     # Verificar si puede retroceder
-    can_go_back = len(state.fragments_visited) > 1 if state else False
+    can_go_back = state.fragments_visited_count > 1 if state else False
     
     # Generar teclado apropiado
     if fragment.type == "ending":
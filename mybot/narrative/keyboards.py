@@ -2,7 +2,10 @@
 Teclados inline para el sistema narrativo
 """
 from __future__ import annotations
-from typing import List, Optional, Dict, Any
+import functools
+from itertools import islice
+from types import MappingProxyType
+from typing import List, Optional, Dict, Any, Tuple
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
@@ -15,12 +18,50 @@ except ImportError:
 from .constants import MAX_CHOICES_PER_FRAGMENT, BACK_BUTTON_ENABLED
 
 
+# Botones de navegación constantes, compartidos por todos los teclados
+BTN_MAIN_MENU = InlineKeyboardButton(text="🔙 Menú Principal", callback_data="main_menu")
+BTN_HOME = InlineKeyboardButton(text="🏠 Menú Principal", callback_data="main_menu")
+BTN_NARRATIVE_MENU = InlineKeyboardButton(text="📑 Menú", callback_data="narrative_menu")
+BTN_NARRATIVE_BACK = InlineKeyboardButton(text="🔙 Atrás", callback_data="narrative_menu")
+BTN_FRAGMENT_BACK = InlineKeyboardButton(text="◀️ Atrás", callback_data="narrative_back")
+BTN_FRAGMENT_RETURN = InlineKeyboardButton(text="🔙 Volver", callback_data="narrative_back")
+BTN_ADMIN_BACK = InlineKeyboardButton(text="🔙 Atrás", callback_data="nadmin_back")
+
+_ADMIN_CALLBACK_PREFIX = "narrative_admin_"
+_HISTORY_PAGE_PREFIX = "narrative_history_page_"
+
+
+@functools.lru_cache(maxsize=1024)
+def _admin_cbdata(verb: str, story_id: str, fragment_id: str) -> str:
+    """callback_data de las acciones admin sobre un fragmento"""
+    return f"{_ADMIN_CALLBACK_PREFIX}{verb}_{story_id}_{fragment_id}"
+
+
+@functools.lru_cache(maxsize=1024)
+def _history_page_cbdata(story_id: str, page: int) -> str:
+    """callback_data de una página del historial"""
+    return f"{_HISTORY_PAGE_PREFIX}{story_id}_{page}"
+
+
+# Los teclados sin datos del usuario se memorizan: InlineKeyboardMarkup no se
+# modifica tras construirse, así que la misma instancia sirve a todos.
+_KEYBOARD_CACHE_SIZE = 64
+# Los teclados de fragmento varían por fragmento y navegación
+_FRAGMENT_CACHE_SIZE = 1024
+# Los parámetros con prefijo "_" de los builders más usados fijan constantes
+# globales como variables locales; no forman parte de la API.
+
+
 class NarrativeKeyboards:
     """Generador de teclados para narrativa"""
     
     @staticmethod
     def main_menu(has_active_story: bool = False, is_vip: bool = False) -> InlineKeyboardMarkup:
         """Menú principal de narrativa"""
+        return _MAIN_MENU_TABLE[(bool(has_active_story), bool(is_vip))]
+    
+    @staticmethod
+    def _build_main_menu(has_active_story: bool, is_vip: bool) -> InlineKeyboardMarkup:
         builder = InlineKeyboardBuilder()
         
         if has_active_story:
@@ -68,18 +109,17 @@ class NarrativeKeyboards:
                 )
             )
         
-        builder.row(
-            InlineKeyboardButton(
-                text="🔙 Menú Principal",
-                callback_data="main_menu"
-            )
-        )
+        builder.row(BTN_MAIN_MENU)
         
         return builder.as_markup()
     
     @staticmethod
     def story_selection(has_vip_access: bool = False) -> InlineKeyboardMarkup:
         """Selección de historia para comenzar"""
+        return _STORY_SELECTION_TABLE[bool(has_vip_access)]
+    
+    @staticmethod
+    def _build_story_selection(has_vip_access: bool) -> InlineKeyboardMarkup:
         builder = InlineKeyboardBuilder()
         
         builder.row(
@@ -104,12 +144,7 @@ class NarrativeKeyboards:
                 )
             )
         
-        builder.row(
-            InlineKeyboardButton(
-                text="🔙 Atrás",
-                callback_data="narrative_menu"
-            )
-        )
+        builder.row(BTN_NARRATIVE_BACK)
         
         return builder.as_markup()
     
@@ -117,53 +152,70 @@ class NarrativeKeyboards:
     def story_fragment(
         fragment: FragmentSchema,
         can_go_back: bool = False,
-        chapter_info: Optional[Dict[str, Any]] = None
+        chapter_info: Optional[Dict[str, Any]] = None,
+        _max_choices: int = MAX_CHOICES_PER_FRAGMENT
     ) -> InlineKeyboardMarkup:
         """Teclado para un fragmento de historia"""
+        # El fragmento no es hashable: se reduce a los datos que definen el teclado
+        choices = ()
+        if fragment.type == "decision" and fragment.choices:
+            choices = tuple(
+                (choice.id, choice.text)
+                for choice in islice(fragment.choices, _max_choices)
+            )
+        chapter_label = str(chapter_info.get('current', '?')) if chapter_info else None
+        
+        return NarrativeKeyboards._story_fragment_markup(
+            choices,
+            fragment.next_fragment,
+            can_go_back,
+            chapter_label
+        )
+    
+    @staticmethod
+    @functools.lru_cache(maxsize=_FRAGMENT_CACHE_SIZE)
+    def _story_fragment_markup(
+        choices: Tuple[Tuple[str, str], ...],
+        next_fragment: Optional[str],
+        can_go_back: bool,
+        chapter_label: Optional[str],
+        _back_enabled: bool = BACK_BUTTON_ENABLED,
+        _button: type = InlineKeyboardButton
+    ) -> InlineKeyboardMarkup:
         builder = InlineKeyboardBuilder()
         
         # Si es un punto de decisión, mostrar opciones
-        if fragment.type == "decision" and fragment.choices:
-            for i, choice in enumerate(fragment.choices[:MAX_CHOICES_PER_FRAGMENT]):
+        if choices:
+            for i, (choice_id, choice_text) in enumerate(choices):
                 # Formato: narrative_choice_{choice_id}
                 builder.row(
-                    InlineKeyboardButton(
-                        text=f"{i+1}. {choice.text}",
-                        callback_data=f"narrative_choice_{choice.id}"
+                    _button(
+                        text=f"{i+1}. {choice_text}",
+                        callback_data=f"narrative_choice_{choice_id}"
                     )
                 )
         
         # Si tiene siguiente fragmento automático
-        elif fragment.next_fragment:
+        elif next_fragment:
             builder.row(
-                InlineKeyboardButton(
+                _button(
                     text="➡️ Continuar",
-                    callback_data=f"narrative_next_{fragment.next_fragment}"
+                    callback_data=f"narrative_next_{next_fragment}"
                 )
             )
         
         # Botones de navegación
         nav_buttons = []
         
-        if BACK_BUTTON_ENABLED and can_go_back:
-            nav_buttons.append(
-                InlineKeyboardButton(
-                    text="◀️ Atrás",
-                    callback_data="narrative_back"
-                )
-            )
+        if _back_enabled and can_go_back:
+            nav_buttons.append(BTN_FRAGMENT_BACK)
         
-        nav_buttons.append(
-            InlineKeyboardButton(
-                text="📑 Menú",
-                callback_data="narrative_menu"
-            )
-        )
+        nav_buttons.append(BTN_NARRATIVE_MENU)
         
-        if chapter_info:
+        if chapter_label is not None:
             nav_buttons.append(
-                InlineKeyboardButton(
-                    text=f"📍 Cap. {chapter_info.get('current', '?')}",
+                _button(
+                    text=f"📍 Cap. {chapter_label}",
                     callback_data="narrative_chapter_info"
                 )
             )
@@ -179,6 +231,12 @@ class NarrativeKeyboards:
         has_hint: bool = False
     ) -> InlineKeyboardMarkup:
         """Teclado para fragmento bloqueado"""
+        # Los requisitos solo se muestran en el texto; el teclado depende del hint
+        return NarrativeKeyboards._locked_fragment_markup(has_hint)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=_KEYBOARD_CACHE_SIZE)
+    def _locked_fragment_markup(has_hint: bool) -> InlineKeyboardMarkup:
         builder = InlineKeyboardBuilder()
         
         if has_hint:
@@ -197,14 +255,8 @@ class NarrativeKeyboards:
         )
         
         builder.row(
-            InlineKeyboardButton(
-                text="🔙 Volver",
-                callback_data="narrative_back"
-            ),
-            InlineKeyboardButton(
-                text="🏠 Menú Principal",
-                callback_data="main_menu"
-            )
+            BTN_FRAGMENT_RETURN,
+            BTN_HOME
         )
         
         return builder.as_markup()
@@ -250,10 +302,7 @@ class NarrativeKeyboards:
                 text="📚 Volver a Historias",
                 callback_data="narrative_my_stories"
             ),
-            InlineKeyboardButton(
-                text="🏠 Menú Principal",
-                callback_data="main_menu"
-            )
+            BTN_HOME
         )
         
         return builder.as_markup()
@@ -262,7 +311,8 @@ class NarrativeKeyboards:
     def history_navigation(
         page: int,
         total_pages: int,
-        story_id: str
+        story_id: str,
+        _button: type = InlineKeyboardButton
     ) -> InlineKeyboardMarkup:
         """Navegación para historial de decisiones"""
         builder = InlineKeyboardBuilder()
@@ -271,14 +321,14 @@ class NarrativeKeyboards:
         
         if page > 1:
             nav_buttons.append(
-                InlineKeyboardButton(
+                _button(
                     text="⬅️",
-                    callback_data=f"narrative_history_page_{story_id}_{page-1}"
+                    callback_data=_history_page_cbdata(story_id, page-1)
                 )
             )
         
         nav_buttons.append(
-            InlineKeyboardButton(
+            _button(
                 text=f"{page}/{total_pages}",
                 callback_data="narrative_history_info"
             )
@@ -286,9 +336,9 @@ class NarrativeKeyboards:
         
         if page < total_pages:
             nav_buttons.append(
-                InlineKeyboardButton(
+                _button(
                     text="➡️",
-                    callback_data=f"narrative_history_page_{story_id}_{page+1}"
+                    callback_data=_history_page_cbdata(story_id, page+1)
                 )
             )
         
@@ -296,22 +346,18 @@ class NarrativeKeyboards:
             builder.row(*nav_buttons)
         
         builder.row(
-            InlineKeyboardButton(
+            _button(
                 text="📊 Estadísticas Completas",
                 callback_data=f"narrative_story_stats_{story_id}"
             )
         )
         
-        builder.row(
-            InlineKeyboardButton(
-                text="🔙 Atrás",
-                callback_data="narrative_menu"
-            )
-        )
+        builder.row(BTN_NARRATIVE_BACK)
         
         return builder.as_markup()
     
     @staticmethod
+    @functools.lru_cache(maxsize=_KEYBOARD_CACHE_SIZE)
     def admin_fragment_actions(fragment_id: str, story_id: str) -> InlineKeyboardMarkup:
         """Acciones de administrador para un fragmento"""
         builder = InlineKeyboardBuilder()
@@ -319,22 +365,22 @@ class NarrativeKeyboards:
         builder.row(
             InlineKeyboardButton(
                 text="✏️ Editar",
-                callback_data=f"narrative_admin_edit_{story_id}_{fragment_id}"
+                callback_data=_admin_cbdata("edit", story_id, fragment_id)
             ),
             InlineKeyboardButton(
                 text="📊 Stats",
-                callback_data=f"narrative_admin_stats_{story_id}_{fragment_id}"
+                callback_data=_admin_cbdata("stats", story_id, fragment_id)
             )
         )
         
         builder.row(
             InlineKeyboardButton(
                 text="🔀 Probar Caminos",
-                callback_data=f"narrative_admin_test_{story_id}_{fragment_id}"
+                callback_data=_admin_cbdata("test", story_id, fragment_id)
             ),
             InlineKeyboardButton(
                 text="👥 Ver Usuarios",
-                callback_data=f"narrative_admin_users_{story_id}_{fragment_id}"
+                callback_data=_admin_cbdata("users", story_id, fragment_id)
             )
         )
         
@@ -348,6 +394,7 @@ class NarrativeKeyboards:
         return builder.as_markup()
     
     @staticmethod
+    @functools.lru_cache(maxsize=_KEYBOARD_CACHE_SIZE)
     def admin_main_menu() -> InlineKeyboardMarkup:
         """Menú principal de administración narrativa"""
         builder = InlineKeyboardBuilder()
@@ -367,6 +414,7 @@ class NarrativeKeyboards:
         return builder.as_markup()
     
     @staticmethod
+    @functools.lru_cache(maxsize=_KEYBOARD_CACHE_SIZE)
     def admin_stats_menu() -> InlineKeyboardMarkup:
         """Menú de estadísticas admin"""
         builder = InlineKeyboardBuilder()
@@ -375,13 +423,12 @@ class NarrativeKeyboards:
             InlineKeyboardButton(text="📈 Detalladas", callback_data="nadmin_detailed_stats"),
             InlineKeyboardButton(text="📊 Por Historia", callback_data="nadmin_story_stats")
         )
-        builder.row(
-            InlineKeyboardButton(text="🔙 Atrás", callback_data="nadmin_back")
-        )
+        builder.row(BTN_ADMIN_BACK)
         
         return builder.as_markup()
     
     @staticmethod
+    @functools.lru_cache(maxsize=_KEYBOARD_CACHE_SIZE)
     def admin_users_menu() -> InlineKeyboardMarkup:
         """Menú de usuarios admin"""
         builder = InlineKeyboardBuilder()
@@ -390,13 +437,12 @@ class NarrativeKeyboards:
             InlineKeyboardButton(text="🔍 Buscar Usuario", callback_data="nadmin_search_user"),
             InlineKeyboardButton(text="🔄 Resetear Usuario", callback_data="nadmin_reset_user")
         )
-        builder.row(
-            InlineKeyboardButton(text="🔙 Atrás", callback_data="nadmin_back")
-        )
+        builder.row(BTN_ADMIN_BACK)
         
         return builder.as_markup()
     
     @staticmethod
+    @functools.lru_cache(maxsize=_KEYBOARD_CACHE_SIZE)
     def admin_stories_menu() -> InlineKeyboardMarkup:
         """Menú de gestión de historias"""
         builder = InlineKeyboardBuilder()
@@ -408,13 +454,12 @@ class NarrativeKeyboards:
         builder.row(
             InlineKeyboardButton(text="📊 Stats por Historia", callback_data="nadmin_story_detailed")
         )
-        builder.row(
-            InlineKeyboardButton(text="🔙 Atrás", callback_data="nadmin_back")
-        )
+        builder.row(BTN_ADMIN_BACK)
         
         return builder.as_markup()
     
     @staticmethod
+    @functools.lru_cache(maxsize=_KEYBOARD_CACHE_SIZE)
     def admin_debug_menu() -> InlineKeyboardMarkup:
         """Menú de herramientas de debug"""
         builder = InlineKeyboardBuilder()
@@ -426,13 +471,12 @@ class NarrativeKeyboards:
         builder.row(
             InlineKeyboardButton(text="📊 Regenerar Métricas", callback_data="nadmin_regenerate_metrics")
         )
-        builder.row(
-            InlineKeyboardButton(text="🔙 Atrás", callback_data="nadmin_back")
-        )
+        builder.row(BTN_ADMIN_BACK)
         
         return builder.as_markup()
     
     @staticmethod
+    @functools.lru_cache(maxsize=_KEYBOARD_CACHE_SIZE)
     def admin_orphan_cleanup(has_orphans: bool) -> InlineKeyboardMarkup:
         """Opciones para limpiar estados huérfanos"""  
         builder = InlineKeyboardBuilder()
@@ -450,13 +494,24 @@ class NarrativeKeyboards:
         return builder.as_markup()
     
     @staticmethod
+    @functools.lru_cache(maxsize=_KEYBOARD_CACHE_SIZE)
     def admin_back_button() -> InlineKeyboardMarkup:
         """Simple botón de atrás para admin"""
         builder = InlineKeyboardBuilder()
         
-        builder.row(
-            InlineKeyboardButton(text="🔙 Atrás", callback_data="nadmin_back")
-        )
+        builder.row(BTN_ADMIN_BACK)
         
         return builder.as_markup()
-      
+
+
+# Menús sin datos por usuario: todas sus variantes se construyen al importar
+_MAIN_MENU_TABLE = MappingProxyType({
+    (has_active_story, is_vip): NarrativeKeyboards._build_main_menu(has_active_story, is_vip)
+    for has_active_story in (False, True)
+    for is_vip in (False, True)
+})
+
+_STORY_SELECTION_TABLE = MappingProxyType({
+    has_vip_access: NarrativeKeyboards._build_story_selection(has_vip_access)
+    for has_vip_access in (False, True)
+})
@@ -0,0 +1,110 @@
+"""
+Buffer en memoria de métricas narrativas
+Las visitas y elecciones se acumulan por fragmento y se vuelcan a
+NarrativeMetrics en lote desde una tarea en segundo plano, fuera del
+camino de respuesta al usuario
+"""
+import asyncio
+import logging
+from collections import Counter, defaultdict
+from typing import Dict
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from .constants import METRICS_FLUSH_INTERVAL
+from .models import NarrativeMetrics
+
+logger = logging.getLogger(__name__)
+
+
+class NarrativeMetricsBuffer:
+    """Acumula contadores de métricas hasta el siguiente volcado"""
+
+    def __init__(self):
+        self._visits: Counter = Counter()
+        self._choices: Dict[str, Counter] = defaultdict(Counter)
+
+    def record_visit(self, fragment_id: str) -> None:
+        """Registra la visita a un fragmento"""
+        self._visits[fragment_id] += 1
+
+    def record_choice(self, fragment_id: str, choice_id: str) -> None:
+        """Registra una elección en un fragmento"""
+        self._choices[fragment_id][choice_id] += 1
+
+    def _merge(self, visits: Counter, choices: Dict[str, Counter]) -> None:
+        """Devuelve al buffer contadores que no se pudieron volcar"""
+        self._visits.update(visits)
+        for fragment_id, counts in choices.items():
+            self._choices[fragment_id].update(counts)
+
+    async def flush(self, session_factory: async_sessionmaker[AsyncSession]) -> int:
+        """
+        Vuelca los contadores acumulados en una sola transacción
+        Returns: número de fragmentos actualizados
+        """
+        if not self._visits and not self._choices:
+            return 0
+
+        # Intercambio sin await: lo que llegue durante el volcado va al buffer nuevo
+        visits, choices = self._visits, self._choices
+        self._visits, self._choices = Counter(), defaultdict(Counter)
+        fragment_ids = set(visits) | set(choices)
+
+        try:
+            async with session_factory() as session:
+                result = await session.execute(
+                    select(NarrativeMetrics).where(
+                        NarrativeMetrics.fragment_id.in_(fragment_ids)
+                    )
+                )
+                existing = {m.fragment_id: m for m in result.scalars()}
+
+                for fragment_id in fragment_ids:
+                    metrics = existing.get(fragment_id)
+                    if metrics is None:
+                        metrics = NarrativeMetrics(
+                            fragment_id=fragment_id,
+                            times_visited=0,
+                            choice_distribution={}
+                        )
+                        session.add(metrics)
+
+                    metrics.times_visited = (metrics.times_visited or 0) + visits.get(fragment_id, 0)
+                    if fragment_id in choices:
+                        # Nuevo dict: la columna JSON no detecta cambios en sitio
+                        distribution = dict(metrics.choice_distribution or {})
+                        for choice_id, count in choices[fragment_id].items():
+                            distribution[choice_id] = distribution.get(choice_id, 0) + count
+                        metrics.choice_distribution = distribution
+
+                await session.commit()
+        except Exception:
+            self._merge(visits, choices)
+            raise
+
+        return len(fragment_ids)
+
+
+metrics_buffer = NarrativeMetricsBuffer()
+
+
+async def narrative_metrics_scheduler(session_factory: async_sessionmaker[AsyncSession]):
+    """Background task flushing buffered narrative metrics."""
+    logger.info("Narrative metrics scheduler started")
+    try:
+        while True:
+            await asyncio.sleep(METRICS_FLUSH_INTERVAL)
+            try:
+                await metrics_buffer.flush(session_factory)
+            except Exception:
+                logger.exception("Error flushing narrative metrics")
+    except asyncio.CancelledError:
+        # Volcado final al apagar el bot
+        try:
+            await metrics_buffer.flush(session_factory)
+        except Exception:
+            logger.exception("Error flushing narrative metrics on shutdown")
+        logger.info("Narrative metrics scheduler cancelled")
+        raise
@@ -4,10 +4,12 @@ Modelos de base de datos para el sistema narrativo
 from __future__ import annotations
 from sqlalchemy import (
     Column, Integer, String, BigInteger, DateTime, Boolean,
-    JSON, Text, ForeignKey, Float, Enum, UniqueConstraint
+    JSON, Text, ForeignKey, Float, Enum, UniqueConstraint, Index
 )
 from sqlalchemy.orm import relationship, declared_attr
+from sqlalchemy.orm.attributes import flag_modified
 from sqlalchemy.sql import func
+from typing import Dict, Optional
 from database.base import Base
 import enum
 
@@ -89,6 +91,7 @@ class UserNarrativeState(Base):
     fragments_visited = Column(JSON, default=list)  # Lista de IDs visitados
     total_decisions_made = Column(Integer, default=0)
     story_completion_percent = Column(Float, default=0.0)
+    endings_reached = Column(JSON, default=list)  # [{id, title, chapter}] en orden de llegada
     
     # Estado de historias
     free_story_unlocked = Column(Boolean, default=True)
@@ -101,9 +104,14 @@ class UserNarrativeState(Base):
     
     # Timestamps
     started_at = Column(DateTime, default=func.now())
-    last_interaction_at = Column(DateTime, default=func.now())
+    # Se renueva en el propio UPDATE de cada cambio de estado
+    last_interaction_at = Column(DateTime, default=func.now(), onupdate=func.now())
     completed_at = Column(DateTime, nullable=True)
     
+    # Trae los valores generados por SQL (func.now()) con RETURNING en el
+    # mismo INSERT/UPDATE, en vez de dejarlos expirados tras el flush
+    __mapper_args__ = {"eager_defaults": True}
+    
     # Relaciones
     @declared_attr
     def user(cls):
@@ -112,6 +120,45 @@ class UserNarrativeState(Base):
     current_fragment = relationship("StoryFragment", foreign_keys=[current_fragment_id])
     decisions = relationship("UserDecision", back_populates="user_state", lazy="selectin")
 
+    # Índice en memoria (no persistido) de fragments_visited: id -> posición.
+    # Se reconstruye si la lista se reasigna o cambia de tamaño por fuera.
+    def _visited_index(self) -> Dict[str, int]:
+        visited = self.fragments_visited or []
+        cached = self.__dict__.get("_visited_index_cache")
+        if cached is not None and cached[0] is visited and cached[1] == len(visited):
+            return cached[2]
+        index: Dict[str, int] = {}
+        for position, fragment_id in enumerate(visited):
+            index.setdefault(fragment_id, position)
+        self.__dict__["_visited_index_cache"] = (visited, len(visited), index)
+        return index
+
+    def has_visited(self, fragment_id: str) -> bool:
+        """Indica en O(1) si el fragmento ya fue visitado"""
+        return fragment_id in self._visited_index()
+
+    def visited_position(self, fragment_id: str) -> Optional[int]:
+        """Posición del fragmento en el historial de visitas, o None"""
+        return self._visited_index().get(fragment_id)
+
+    def mark_visited(self, fragment_id: str) -> bool:
+        """
+        Añade el fragmento al historial si no estaba
+        Returns: True si se añadió
+        """
+        index = self._visited_index()
+        if fragment_id in index:
+            return False
+        if self.fragments_visited is None:
+            self.fragments_visited = []
+        visited = self.fragments_visited
+        index[fragment_id] = len(visited)
+        visited.append(fragment_id)
+        self.__dict__["_visited_index_cache"] = (visited, len(visited), index)
+        # La columna JSON no detecta mutaciones en sitio
+        flag_modified(self, "fragments_visited")
+        return True
+
 
 class UserDecision(Base):
     """Registro de decisiones tomadas por usuarios"""
@@ -120,10 +167,12 @@ class UserDecision(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(BigInteger, ForeignKey("users.id"), nullable=False)
     fragment_id = Column(String, ForeignKey("story_fragments.id"), nullable=False)
+    story_id = Column(String, nullable=True)  # Historia del fragmento (free/vip), para filtrar sin IN
     choice_id = Column(String, nullable=False)  # ID de la opción elegida
     choice_text = Column(Text, nullable=False)  # Texto de la opción (para historial)
     
     # Contexto
+    fragment_title = Column(String, nullable=True)  # Título del fragmento (para historial)
     chapter = Column(Integer, nullable=False)
     made_at = Column(DateTime, default=func.now())
     
@@ -141,6 +190,8 @@ class UserDecision(Base):
     
     __table_args__ = (
         UniqueConstraint("user_id", "fragment_id", name="uix_user_fragment_decision"),
+        Index("ix_user_decisions_user_recent", user_id, id.desc()),
+        Index("ix_user_decisions_user_story_recent", user_id, story_id, id.desc()),
     )
 
 
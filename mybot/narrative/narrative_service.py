@@ -1,36 +1,124 @@
 """
 Servicio principal de lógica de negocio para el sistema narrativo
 """
+import json
 import logging
 from typing import Dict, List, Optional, Any, Tuple
-from datetime import datetime
-from sqlalchemy import select, and_
+from datetime import datetime, timezone
+from sqlalchemy import (
+    select, insert, update, and_, func, distinct, true, literal, cast, bindparam,
+    BigInteger, JSON
+)
+from sqlalchemy.dialects.postgresql import JSONB, insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, lazyload
+from sqlalchemy.orm.attributes import set_committed_value
 
-from .models import StoryFragment, UserNarrativeState, UserDecision, NarrativeMetrics
-from .story_manager import StoryManager
+from .models import StoryFragment, UserNarrativeState, UserDecision
+from .story_manager import get_story_manager
+from .metrics import metrics_buffer
+from .state_cache import state_cache, NarrativeStateSnapshot
 from .schemas import FragmentSchema, ChoiceSchema
 from .constants import NARRATIVE_POINTS, AUTO_SAVE_INTERVAL
 from database.models import User, Achievement, UserAchievement, LorePiece, UserLorePiece
 
 logger = logging.getLogger(__name__)
 
+# INSERT con soporte de ON CONFLICT DO NOTHING ... RETURNING, por dialecto
+_UPSERT_INSERTS = {
+    "postgresql": pg_insert,
+    "sqlite": sqlite_insert,
+}
+
+# Función que expande un array JSON en filas, por dialecto
+_JSON_ARRAY_ELEMENTS = {
+    "postgresql": "json_array_elements_text",
+    "sqlite": "json_each",
+}
+
+
+
+def _utcnow() -> datetime:
+    """UTC actual sin zona, como las columnas DateTime del modelo"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _json_merge_expression(dialect_name: str, column, patch: Dict[str, Any]):
+    """
+    Expresión SQL que fusiona ``patch`` sobre un objeto JSON en el servidor,
+    o None si el dialecto no la soporta. La fusión es superficial y conserva
+    los valores None, igual que ``{**actual, **patch}`` en memoria
+    """
+    if dialect_name == "postgresql":
+        # Las columnas son JSON (no JSONB): se convierte para usar ||
+        merged = func.coalesce(cast(column, JSONB), cast(literal("{}"), JSONB)).op("||")(
+            bindparam(None, patch, type_=JSONB)
+        )
+        return cast(merged, JSON)
+    if dialect_name == "sqlite":
+        # json_set clave a clave: json_patch (RFC 7396) borraría las claves
+        # con null y fusionaría objetos anidados en profundidad
+        if any('"' in key for key in patch):
+            return None  # Sin forma de escapar la clave en la ruta JSON
+        args = []
+        for key, value in patch.items():
+            args.append(f'$."{key}"')
+            args.append(func.json(bindparam(None, json.dumps(value))))
+        return func.json_set(func.coalesce(column, "{}"), *args)
+    return None
+
 
 class NarrativeService:
     """Servicio que maneja toda la lógica narrativa"""
     
     def __init__(self, session: AsyncSession):
         self.session = session
-        self.story_manager = StoryManager()
+        self.story_manager = get_story_manager()
     
     async def get_user_state(self, user_id: int) -> Optional[UserNarrativeState]:
         """Obtiene el estado narrativo de un usuario"""
         # REF: [narrative/models.py] UserNarrativeState
         return await self.session.get(UserNarrativeState, user_id)
     
+    async def get_state_snapshot(self, user_id: int) -> Optional[NarrativeStateSnapshot]:
+        """
+        Obtiene una instantánea de solo lectura del estado narrativo
+        Sirve desde la caché en proceso si está vigente
+        """
+        snapshot = state_cache.get(user_id)
+        if snapshot is not None:
+            return snapshot
+        state = await self.get_user_state(user_id)
+        return state_cache.put(state) if state else None
+    
+    async def _load_user_with_state(self, user_id: int) -> Optional[User]:
+        """
+        Carga el usuario junto con su estado narrativo y sus logros
+        en una sola consulta (JOIN) para la verificación de requisitos
+        """
+        # Las relaciones selectin del estado (todas las decisiones del usuario
+        # y el propio usuario) añadirían consultas: aquí no se necesitan
+        query = (
+            select(User)
+            .options(
+                joinedload(User.narrative_state).options(
+                    lazyload(UserNarrativeState.decisions),
+                    lazyload(UserNarrativeState.user),
+                ),
+                joinedload(User.unlocked_achievements),
+            )
+            .where(User.id == user_id)
+        )
+        result = await self.session.execute(query)
+        return result.unique().scalar_one_or_none()
+    
     async def initialize_user_narrative(self, user_id: int) -> UserNarrativeState:
         """Inicializa el estado narrativo para un nuevo usuario"""
-        state = UserNarrativeState(
+        # INSERT ... RETURNING: una sola ida y vuelta que además trae los
+        # valores por defecto calculados en SQL (started_at, etc.), que con
+        # session.add quedarían expirados y exigirían otra consulta
+        stmt = insert(UserNarrativeState).values(
             user_id=user_id,
             current_fragment_id=None,
             fragments_visited=[],
@@ -44,9 +132,10 @@ class NarrativeService:
                 "lucien": 0,
                 "diana": 0
             }
-        )
-        self.session.add(state)
+        ).returning(UserNarrativeState)
+        state = (await self.session.execute(stmt)).scalar_one()
         await self.session.commit()
+        state_cache.put(state)
         return state
     
     async def start_story(self, user_id: int, story_id: str) -> Tuple[bool, str, Optional[FragmentSchema]]:
@@ -82,25 +171,27 @@ class NarrativeService:
         state.current_fragment_id = starting_fragment.id
         state.current_chapter = starting_fragment.chapter
         state.fragments_visited = [starting_fragment.id]
+        state.endings_reached = []
         state.story_completion_percent = 0.0
         
         # Marcar historia VIP como desbloqueada si corresponde
         if story_id == "vip":
             state.vip_story_unlocked = True
         
-        await self.session.commit()
+        # Dar puntos por comenzar historia (misma transacción)
+        await self._give_narrative_points(user_id, NARRATIVE_POINTS["fragment_read"])
         
-        # Registrar métrica
-        await self._record_fragment_visit(starting_fragment.id)
+        await self.session.commit()
+        state_cache.put(state)
         
-        # Dar puntos por comenzar historia
-        await self._give_narrative_points(user_id, NARRATIVE_POINTS["fragment_read"])
+        # Registrar métrica (se vuelca en segundo plano)
+        metrics_buffer.record_visit(starting_fragment.id)
         
         return True, f"Historia '{story.title}' iniciada", starting_fragment
     
     async def get_current_fragment(self, user_id: int) -> Optional[FragmentSchema]:
         """Obtiene el fragmento actual del usuario"""
-        state = await self.get_user_state(user_id)
+        state = await self.get_state_snapshot(user_id)
         if not state or not state.current_fragment_id:
             return None
         
@@ -115,7 +206,8 @@ class NarrativeService:
         Procesa una decisión del usuario
         Returns: (success, message, next_fragment)
         """
-        state = await self.get_user_state(user_id)
+        user = await self._load_user_with_state(user_id)
+        state = user.narrative_state if user else None
         if not state:
             return False, "No tienes una historia activa", None
         
@@ -137,9 +229,7 @@ class NarrativeService:
             return False, "Opción no válida", None
         
         # Verificar requisitos de la elección
-        from database.models import User
-        user = await self.session.get(User, user_id)
-        user_data = await self._get_user_data_for_requirements(user_id)
+        user_data = self._get_user_data_for_requirements(user, state)
         can_choose, missing = self.story_manager.check_requirements(
             choice.requirements or {},
             user_data
@@ -161,32 +251,29 @@ class NarrativeService:
         decision = UserDecision(
             user_id=user_id,
             fragment_id=state.current_fragment_id,
+            story_id=state.active_story,
             choice_id=choice_id,
             choice_text=choice.text,
+            fragment_title=current_fragment.title,
             chapter=current_fragment.chapter
         )
         
         # Aplicar efectos de la elección
         if choice.effects:
-            await self._apply_choice_effects(user_id, choice.effects, decision)
+            await self._apply_choice_effects(user, state, choice.effects, decision)
         
         self.session.add(decision)
         
         # Actualizar estado del usuario
         state.current_fragment_id = next_fragment.id
         state.current_chapter = next_fragment.chapter
-        if next_fragment.id not in state.fragments_visited:
-            state.fragments_visited.append(next_fragment.id)
+        state.mark_visited(next_fragment.id)
+        self._record_ending(state, next_fragment)
         state.total_decisions_made += 1
-        state.last_interaction_at = datetime.utcnow()
-        
-        # Auto-save si es checkpoint
-        if next_fragment.type == "checkpoint":
-            await self._create_checkpoint(user_id, state)
         
         # Procesar recompensas del nuevo fragmento
         if next_fragment.rewards:
-            await self._process_fragment_rewards(user_id, next_fragment)
+            await self._process_fragment_rewards(user, state, next_fragment)
         
         # Actualizar porcentaje de completitud
         state.story_completion_percent = self.story_manager.calculate_completion_percent(
@@ -194,20 +281,23 @@ class NarrativeService:
             state.fragments_visited
         )
         
-        await self.session.commit()
+        # Puntos por decisión
+        await self._give_narrative_points(user_id, NARRATIVE_POINTS["decision_made"], user=user)
         
-        # Métricas
-        await self._record_fragment_visit(next_fragment.id)
-        await self._record_choice_metric(state.current_fragment_id, choice_id)
+        # Un único commit para decisión, estado, recompensas y puntos
+        await self.session.commit()
+        state_cache.put(state)
         
-        # Puntos por decisión
-        await self._give_narrative_points(user_id, NARRATIVE_POINTS["decision_made"])
+        # Métricas (se vuelcan en segundo plano)
+        metrics_buffer.record_visit(next_fragment.id)
+        metrics_buffer.record_choice(decision.fragment_id, choice_id)
         
         return True, "Decisión registrada", next_fragment
     
     async def navigate_next(self, user_id: int) -> Tuple[bool, str, Optional[FragmentSchema]]:
         """Navega al siguiente fragmento (cuando no hay decisión)"""
-        state = await self.get_user_state(user_id)
+        user = await self._load_user_with_state(user_id)
+        state = user.narrative_state if user else None
         if not state:
             return False, "No tienes una historia activa", None
         
@@ -228,7 +318,7 @@ class NarrativeService:
             return False, "Error al cargar el siguiente fragmento", None
         
         # Verificar requisitos
-        user_data = await self._get_user_data_for_requirements(user_id)
+        user_data = self._get_user_data_for_requirements(user, state)
         can_access, missing = self.story_manager.check_requirements(
             next_fragment.requirements or {},
             user_data
@@ -241,13 +331,12 @@ class NarrativeService:
         # Actualizar estado
         state.current_fragment_id = next_fragment.id
         state.current_chapter = next_fragment.chapter
-        if next_fragment.id not in state.fragments_visited:
-            state.fragments_visited.append(next_fragment.id)
-        state.last_interaction_at = datetime.utcnow()
+        state.mark_visited(next_fragment.id)
+        self._record_ending(state, next_fragment)
         
         # Procesar recompensas si las hay
         if next_fragment.rewards:
-            await self._process_fragment_rewards(user_id, next_fragment)
+            await self._process_fragment_rewards(user, state, next_fragment)
         
         # Actualizar completitud
         state.story_completion_percent = self.story_manager.calculate_completion_percent(
@@ -255,11 +344,15 @@ class NarrativeService:
             state.fragments_visited
         )
         
+        # Puntos por lectura
+        await self._give_narrative_points(user_id, NARRATIVE_POINTS["fragment_read"], user=user)
+        
+        # Un único commit para estado, recompensas y puntos
         await self.session.commit()
+        state_cache.put(state)
         
-        # Métricas y puntos
-        await self._record_fragment_visit(next_fragment.id)
-        await self._give_narrative_points(user_id, NARRATIVE_POINTS["fragment_read"])
+        # Métricas (se vuelcan en segundo plano)
+        metrics_buffer.record_visit(next_fragment.id)
         
         return True, "Continuando historia", next_fragment
     
@@ -270,8 +363,8 @@ class NarrativeService:
             return False, "No puedes retroceder más", None
         
         # Encontrar el fragmento anterior en el historial
-        current_index = state.fragments_visited.index(state.current_fragment_id)
-        if current_index <= 0:
+        current_index = state.visited_position(state.current_fragment_id)
+        if not current_index:
             return False, "Ya estás en el inicio", None
         
         previous_fragment_id = state.fragments_visited[current_index - 1]
@@ -286,50 +379,102 @@ class NarrativeService:
         # Actualizar estado (sin eliminar del historial)
         state.current_fragment_id = previous_fragment_id
         state.current_chapter = previous_fragment.chapter
-        state.last_interaction_at = datetime.utcnow()
         
         await self.session.commit()
+        state_cache.put(state)
         
         return True, "Has retrocedido", previous_fragment
     
+    async def backfill_decision_story_ids(self) -> int:
+        """
+        Rellena story_id en decisiones anteriores a la columna, a partir de
+        los fragmentos de cada historia. Solo toca filas con story_id NULL,
+        así que tras la primera ejecución no actualiza nada
+        Returns: número de decisiones actualizadas
+        """
+        updated = 0
+        for story_id in self.story_manager.stories:
+            fragment_ids = self.story_manager.get_fragment_ids(story_id)
+            if not fragment_ids:
+                continue
+            stmt = (
+                update(UserDecision)
+                .where(
+                    UserDecision.story_id.is_(None),
+                    UserDecision.fragment_id.in_(fragment_ids)
+                )
+                .values(story_id=story_id)
+                .execution_options(synchronize_session=False)
+            )
+            result = await self.session.execute(stmt)
+            updated += result.rowcount or 0
+        await self.session.commit()
+        return updated
+    
     async def get_user_history(
         self, 
         user_id: int,
         story_id: Optional[str] = None,
         limit: int = 20,
-        offset: int = 0
+        offset: int = 0,
+        before: Optional[int] = None
     ) -> List[Dict[str, Any]]:
-        """Obtiene el historial de decisiones del usuario"""
-        query = select(UserDecision).where(
+        """
+        Obtiene el historial de decisiones del usuario
+        Para páginas profundas pasar ``before`` = id de la última fila recibida
+        en lugar de ``offset``: paginación por cursor sobre el índice. Se ordena
+        por id (autoincremental, crece con made_at): en SQLite made_at no sirve
+        de cursor, se compara como texto con formatos distintos
+        """
+        # Solo las columnas del historial: evita cargar las relaciones
+        # selectin de UserDecision (estado narrativo y sus decisiones)
+        query = select(
+            UserDecision.id,
+            UserDecision.fragment_id,
+            UserDecision.story_id,
+            UserDecision.fragment_title,
+            UserDecision.choice_text,
+            UserDecision.made_at,
+            UserDecision.chapter,
+            UserDecision.points_gained,
+            UserDecision.items_gained
+        ).where(
             UserDecision.user_id == user_id
-        ).order_by(UserDecision.made_at.desc())
+        ).order_by(UserDecision.id.desc())
         
         if story_id:
-            # Filtrar por historia específica
-            fragment_ids = list(self.story_manager._story_cache.get(story_id, {}).keys())
-            query = query.where(UserDecision.fragment_id.in_(fragment_ids))
-        
-        query = query.limit(limit).offset(offset)
-        result = await self.session.execute(query)
-        decisions = result.scalars().all()
-        
-        history = []
-        for decision in decisions:
-            fragment = self.story_manager.get_fragment(
-                story_id or "free",  # Asumir free si no se especifica
-                decision.fragment_id
-            )
-            
-            history.append({
-                "fragment_title": fragment.title if fragment else "Desconocido",
-                "choice_text": decision.choice_text,
-                "made_at": decision.made_at,
-                "chapter": decision.chapter,
-                "points_gained": decision.points_gained,
-                "items_gained": decision.items_gained
-            })
-        
-        return history
+            # Filtrar por historia específica (igualdad indexada, sin lista IN)
+            query = query.where(UserDecision.story_id == story_id)
+        
+        if before is not None:
+            query = query.where(UserDecision.id < before)
+        elif offset:
+            query = query.offset(offset)
+        
+        result = await self.session.execute(query.limit(limit))
+        
+        # Título y capítulo se guardan en la decisión: sin búsquedas por fila
+        # salvo en decisiones antiguas sin fragment_title
+        return [
+            {
+                "id": row.id,
+                "fragment_title": row.fragment_title or self._legacy_fragment_title(row, story_id),
+                "choice_text": row.choice_text,
+                "made_at": row.made_at,
+                "chapter": row.chapter,
+                "points_gained": row.points_gained,
+                "items_gained": row.items_gained
+            }
+            for row in result
+        ]
+    
+    def _legacy_fragment_title(self, row: Any, story_id: Optional[str]) -> str:
+        """Título desde StoryManager para decisiones guardadas sin fragment_title"""
+        fragment = self.story_manager.get_fragment(
+            row.story_id or story_id or "free",  # Asumir free si no consta
+            row.fragment_id
+        )
+        return fragment.title if fragment and fragment.title else "Desconocido"
     
     async def get_user_stats(self, user_id: int) -> Dict[str, Any]:
         """Obtiene estadísticas narrativas del usuario"""
@@ -340,29 +485,22 @@ class NarrativeService:
                 "message": "Aún no has comenzado ninguna historia"
             }
         
-        # Contar decisiones por historia
-        decisions_query = select(UserDecision).where(
-            UserDecision.user_id == user_id
-        )
-        result = await self.session.execute(decisions_query)
-        all_decisions = result.scalars().all()
-        
-        # Calcular estadísticas
-        total_points_from_narrative = sum(d.points_gained for d in all_decisions)
-        unique_items = set()
-        for d in all_decisions:
-            if d.items_gained:
-                unique_items.update(d.items_gained)
-        
-        # Encontrar finales alcanzados
-        endings_reached = []
-        for frag_id in state.fragments_visited:
-            fragment = self.story_manager.get_fragment(state.active_story, frag_id)
-            if fragment and fragment.type == "ending":
-                endings_reached.append({
-                    "title": fragment.title or "Final",
-                    "chapter": fragment.chapter
-                })
+        # Agregados calculados en la base de datos: una fila en lugar de
+        # todas las decisiones del usuario
+        points_query = select(
+            func.coalesce(func.sum(UserDecision.points_gained), 0)
+        ).where(UserDecision.user_id == user_id)
+        total_points_from_narrative = (await self.session.execute(points_query)).scalar_one()
+        unique_items_count = await self._count_unique_items(user_id)
+        
+        # Finales alcanzados: se registran al llegar a ellos (_record_ending).
+        # Estados anteriores a la columna se rellenan una vez desde el historial
+        if self._backfill_endings_reached(state):
+            await self.session.commit()
+        endings_reached = [
+            {"title": ending["title"], "chapter": ending["chapter"]}
+            for ending in state.endings_reached or []
+        ]
         
         return {
             "has_started": True,
@@ -372,81 +510,48 @@ class NarrativeService:
             "total_fragments_visited": len(state.fragments_visited),
             "total_decisions": state.total_decisions_made,
             "total_points_earned": total_points_from_narrative,
-            "unique_items_found": len(unique_items),
+            "unique_items_found": unique_items_count,
             "endings_reached": endings_reached,
             "relationship_scores": state.relationship_scores,
-            "time_played": (datetime.utcnow() - state.started_at).total_seconds() / 3600,  # horas
+            "time_played": (_utcnow() - state.started_at).total_seconds() / 3600,  # horas
             "last_played": state.last_interaction_at
         }
     
     async def check_achievements(self, user_id: int) -> List[Any]:
         """Verifica y otorga logros narrativos"""
-        from database.models import Achievement
         state = await self.get_user_state(user_id)
         if not state:
             return []
         
-        new_achievements = []
-        
         # REF: [database/models.py] Achievement
-        # Verificar logros por decisiones
-        if state.total_decisions_made >= 10:
-            achievement = await self._check_and_award_achievement(
-                user_id, "narrative_10_decisions"
-            )
-            if achievement:
-                new_achievements.append(achievement)
-        
-        if state.total_decisions_made >= 50:
-            achievement = await self._check_and_award_achievement(
-                user_id, "narrative_50_decisions"
-            )
-            if achievement:
-                new_achievements.append(achievement)
-        
-        # Verificar logros por completitud
-        if state.story_completion_percent >= 25:
-            achievement = await self._check_and_award_achievement(
-                user_id, "narrative_25_percent"
-            )
-            if achievement:
-                new_achievements.append(achievement)
-        
-        if state.story_completion_percent >= 100:
-            achievement = await self._check_and_award_achievement(
-                user_id, f"narrative_complete_{state.active_story}"
-            )
-            if achievement:
-                new_achievements.append(achievement)
-        
-        # Verificar logros por relaciones
-        if state.relationship_scores.get("lucien", 0) >= 50:
-            achievement = await self._check_and_award_achievement(
-                user_id, "lucien_trusted"
-            )
-            if achievement:
-                new_achievements.append(achievement)
-        
+        # Candidatos por decisiones, completitud y relaciones
+        thresholds = [
+            (state.total_decisions_made >= 10, "narrative_10_decisions"),
+            (state.total_decisions_made >= 50, "narrative_50_decisions"),
+            (state.story_completion_percent >= 25, "narrative_25_percent"),
+            (state.story_completion_percent >= 100, f"narrative_complete_{state.active_story}"),
+            (state.relationship_scores.get("lucien", 0) >= 50, "lucien_trusted"),
+        ]
+        candidates = [achievement_id for reached, achievement_id in thresholds if reached]
+        
+        new_achievements = await self._award_achievements(user_id, candidates)
+        if new_achievements:
+            await self.session.commit()
         return new_achievements
     
     # Métodos privados auxiliares
     
-    async def _get_user_data_for_requirements(self, user_id: int) -> Dict[str, Any]:
-        """Obtiene datos del usuario necesarios para verificar requisitos"""
-        from database.models import User
-        user = await self.session.get(User, user_id)
-        state = await self.get_user_state(user_id)
-        
-        # REF: [database/models.py] User, UserAchievement
-        # Obtener logros del usuario
-        from sqlalchemy import select
-        from database.models import UserAchievement
-        
-        achievements_query = select(UserAchievement.achievement_id).where(
-            UserAchievement.user_id == user_id
-        )
-        result = await self.session.execute(achievements_query)
-        achievements = [a[0] for a in result.all()]
+    def _get_user_data_for_requirements(
+        self,
+        user: User,
+        state: UserNarrativeState
+    ) -> Dict[str, Any]:
+        """
+        Obtiene datos del usuario necesarios para verificar requisitos
+        Usa el usuario cargado por _load_user_with_state (sin consultas extra)
+        """
+        # REF: [database/models.py] User.unlocked_achievements
+        achievements = [ua.achievement_id for ua in user.unlocked_achievements]
         
         # TODO: Integrar con sistema de mochila cuando esté disponible
         items = []  # Por ahora vacío
@@ -459,26 +564,89 @@ class NarrativeService:
             "story_flags": state.story_flags if state else {}
         }
     
+    async def _count_unique_items(self, user_id: int) -> int:
+        """Cuenta los items distintos obtenidos en las decisiones del usuario"""
+        elements_func = _JSON_ARRAY_ELEMENTS.get(self.session.get_bind().dialect.name)
+        if elements_func is None:
+            # Dialecto sin soporte: reducir en Python solo la columna de items
+            query = select(UserDecision.items_gained).where(
+                UserDecision.user_id == user_id
+            )
+            result = await self.session.execute(query)
+            unique_items = set()
+            for items in result.scalars():
+                if items:
+                    unique_items.update(items)
+            return len(unique_items)
+        
+        items = getattr(func, elements_func)(UserDecision.items_gained).table_valued("value")
+        query = (
+            select(func.count(distinct(items.c.value)))
+            .select_from(UserDecision)
+            .join(items, true())
+            .where(UserDecision.user_id == user_id)
+        )
+        return (await self.session.execute(query)).scalar_one()
+    
+    def _backfill_endings_reached(self, state: UserNarrativeState) -> bool:
+        """
+        Calcula endings_reached desde fragments_visited si aún es NULL
+        (estados creados antes de la columna)
+        Returns: True si se rellenó
+        """
+        if state.endings_reached is not None:
+            return False
+        endings = []
+        for frag_id in state.fragments_visited or []:
+            fragment = self.story_manager.get_fragment(state.active_story, frag_id)
+            if fragment and fragment.type == "ending":
+                endings.append({
+                    "id": fragment.id,
+                    "title": fragment.title or "Final",
+                    "chapter": fragment.chapter
+                })
+        state.endings_reached = endings
+        return True
+    
+    def _record_ending(self, state: UserNarrativeState, fragment: FragmentSchema) -> None:
+        """Añade el fragmento a endings_reached si es un final aún no registrado"""
+        if fragment.type != "ending":
+            return
+        # Rellenar antes de añadir para no perder finales previos
+        self._backfill_endings_reached(state)
+        endings = state.endings_reached
+        if any(ending.get("id") == fragment.id for ending in endings):
+            return
+        # Nueva lista: la columna JSON no detecta mutaciones en sitio
+        state.endings_reached = endings + [{
+            "id": fragment.id,
+            "title": fragment.title or "Final",
+            "chapter": fragment.chapter
+        }]
+    
     async def _apply_choice_effects(
         self, 
-        user_id: int,
+        user: User,
+        state: UserNarrativeState,
         effects: Dict[str, Any],
         decision: UserDecision
     ) -> None:
-        """Aplica los efectos de una elección"""
-        state = await self.get_user_state(user_id)
-        if not state:
-            return
-        
-        # Aplicar cambios en relaciones
+        """Aplica los efectos de una elección sobre el estado ya cargado"""
+        # Aplicar cambios en relaciones (solo se envían las claves afectadas)
+        scores_patch = {}
         if "relationships" in effects:
+            current_scores = state.relationship_scores or {}
             for character, change in effects["relationships"].items():
-                current = state.relationship_scores.get(character, 0)
-                state.relationship_scores[character] = current + change
+                scores_patch[character] = current_scores.get(character, 0) + change
         
         # Aplicar flags de historia
-        if "story_flags" in effects:
-            state.story_flags.update(effects["story_flags"])
+        flags_patch = dict(effects.get("story_flags") or {})
+        
+        await self._merge_state_json(
+            state,
+            relationship_scores=scores_patch,
+            story_flags=flags_patch
+        )
         
         # Registrar items ganados (para futura integración)
         if "items" in effects:
@@ -487,53 +655,131 @@ class NarrativeService:
         # Registrar puntos ganados
         if "points" in effects:
             decision.points_gained = effects["points"]
-            await self._give_narrative_points(user_id, effects["points"])
+            await self._give_narrative_points(user.id, effects["points"], user=user)
     
     async def _process_fragment_rewards(
         self,
-        user_id: int,
+        user: User,
+        state: UserNarrativeState,
         fragment: FragmentSchema
     ) -> None:
-        """Procesa las recompensas de un fragmento"""
+        """Procesa las recompensas de un fragmento con el usuario y estado ya cargados"""
         if not fragment.rewards:
             return
         
         rewards = fragment.rewards
         
         # Dar puntos
-        if hasattr(rewards, 'points') and rewards.points > 0:
-            await self._give_narrative_points(user_id, rewards.points)
+        if rewards.points > 0:
+            await self._give_narrative_points(user.id, rewards.points, user=user)
         
-        # Otorgar logros
-        if hasattr(rewards, 'achievements'):
-            for achievement_id in rewards.achievements:
-                await self._check_and_award_achievement(user_id, achievement_id)
+        # Otorgar logros (un solo INSERT para todos)
+        await self._award_achievements(user.id, rewards.achievements)
         
         # REF: [database/models.py] LorePiece
-        # Desbloquear pistas
-        if hasattr(rewards, 'lore_pieces'):
-            for lore_code in rewards.lore_pieces:
-                await self._unlock_lore_piece(user_id, lore_code)
+        # Desbloquear pistas (un solo INSERT para todas)
+        await self._unlock_lore_pieces(user.id, rewards.lore_pieces)
         
         # Desbloquear fragmentos ocultos
-        if hasattr(rewards, 'unlock_fragments'):
-            state = await self.get_user_state(user_id)
-            if state:
-                # Marcar fragmentos como descubiertos en story_flags
-                if "discovered_fragments" not in state.story_flags:
-                    state.story_flags["discovered_fragments"] = []
-                
-                # Agregar fragmentos desbloqueados
-                for fragment_id in rewards.unlock_fragments:
-                    if fragment_id not in state.story_flags["discovered_fragments"]:
-                        state.story_flags["discovered_fragments"].append(fragment_id)
+        if not rewards.unlock_fragments:
+            return
+        # Marcar fragmentos como descubiertos en story_flags
+        discovered = list((state.story_flags or {}).get("discovered_fragments", []))
+        
+        # Agregar fragmentos desbloqueados
+        for fragment_id in rewards.unlock_fragments:
+            if fragment_id not in discovered:
+                discovered.append(fragment_id)
+        
+        await self._merge_state_json(
+            state,
+            story_flags={"discovered_fragments": discovered}
+        )
+
+    async def _merge_state_json(
+        self,
+        state: UserNarrativeState,
+        **patches: Dict[str, Any]
+    ) -> None:
+        """
+        Fusiona claves en columnas JSON del estado (story_flags,
+        relationship_scores) con un UPDATE que hace la mezcla en el servidor,
+        sin reescribir el objeto completo desde Python. El estado en memoria
+        se actualiza como ya persistido para que el flush no lo repita.
+        """
+        dialect_name = self.session.get_bind().dialect.name
+        values = {}
+        for attr, patch in patches.items():
+            if not patch:
+                continue
+            merged = {**(getattr(state, attr) or {}), **patch}
+            expression = _json_merge_expression(
+                dialect_name, getattr(UserNarrativeState, attr), patch
+            )
+            if expression is None:
+                # Dialecto sin fusión JSON: reasignar para que el ORM lo detecte
+                setattr(state, attr, merged)
+            else:
+                values[attr] = expression
+                set_committed_value(state, attr, merged)
+        
+        if values:
+            stmt = (
+                update(UserNarrativeState)
+                .where(UserNarrativeState.user_id == state.user_id)
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            )
+            await self.session.execute(stmt)
 
+    async def _award_achievements(
+        self,
+        user_id: int,
+        achievement_ids: List[str]
+    ) -> List[Achievement]:
+        """
+        Otorga en bloque los logros indicados que existan y el usuario no tenga
+        Returns: logros recién otorgados, en el orden de achievement_ids
+        """
+        if not achievement_ids:
+            return []
+        
+        insert_func = _UPSERT_INSERTS.get(self.session.get_bind().dialect.name)
+        if insert_func is None:
+            # Dialecto sin ON CONFLICT: comprobar uno a uno
+            awarded = []
+            for achievement_id in achievement_ids:
+                achievement = await self._check_and_award_achievement(user_id, achievement_id)
+                if achievement:
+                    awarded.append(achievement)
+            return awarded
+        
+        # Un solo INSERT ... SELECT: solo logros existentes, sin duplicados
+        source = select(literal(user_id, BigInteger), Achievement.id).where(
+            Achievement.id.in_(achievement_ids)
+        )
+        stmt = (
+            insert_func(UserAchievement)
+            .from_select(["user_id", "achievement_id"], source)
+            .on_conflict_do_nothing()
+            .returning(UserAchievement.achievement_id)
+        )
+        new_ids = set((await self.session.execute(stmt)).scalars().all())
+        if not new_ids:
+            return []
+        
+        result = await self.session.execute(
+            select(Achievement).where(Achievement.id.in_(new_ids))
+        )
+        by_id = {achievement.id: achievement for achievement in result.scalars()}
+        return [by_id[aid] for aid in achievement_ids if aid in by_id]
+    
     async def _check_and_award_achievement(
         self,
         user_id: int, 
         achievement_id: str
     ) -> Optional[object]:
-        """Verifica y otorga un logro específico"""
+        """Verifica y otorga un logro específico (el llamador hace commit)"""
         from database.models import Achievement, UserAchievement
         
         # Verificar si el logro existe
@@ -560,12 +806,36 @@ class NarrativeService:
             achievement_id=achievement_id
         )
         self.session.add(user_achievement)
-        await self.session.commit()
         
         return achievement
 
+    async def _unlock_lore_pieces(self, user_id: int, lore_codes: List[str]) -> None:
+        """
+        Desbloquea en bloque las piezas de lore indicadas que existan
+        y el usuario no tenga (el llamador hace commit)
+        """
+        if not lore_codes:
+            return
+        
+        insert_func = _UPSERT_INSERTS.get(self.session.get_bind().dialect.name)
+        if insert_func is None:
+            # Dialecto sin ON CONFLICT: desbloquear una a una
+            for lore_code in lore_codes:
+                await self._unlock_lore_piece(user_id, lore_code)
+            return
+        
+        source = select(literal(user_id, BigInteger), LorePiece.id).where(
+            LorePiece.code_name.in_(lore_codes)
+        )
+        stmt = (
+            insert_func(UserLorePiece)
+            .from_select(["user_id", "lore_piece_id"], source)
+            .on_conflict_do_nothing()
+        )
+        await self.session.execute(stmt)
+
     async def _unlock_lore_piece(self, user_id: int, lore_code: str) -> None:
-        """Desbloquea una pieza de lore para el usuario"""
+        """Desbloquea una pieza de lore para el usuario (el llamador hace commit)"""
         from database.models import LorePiece, UserLorePiece
         
         # Buscar la pieza de lore
@@ -595,61 +865,18 @@ class NarrativeService:
             lore_piece_id=lore_piece.id
         )
         self.session.add(user_lore)
-        await self.session.commit()
 
-    async def _give_narrative_points(self, user_id: int, points: int) -> None:
-        """Otorga puntos narrativos al usuario"""
-        from database.models import User
-        
-        user = await self.session.get(User, user_id)
+    async def _give_narrative_points(
+        self,
+        user_id: int,
+        points: float,
+        user: Optional[User] = None
+    ) -> None:
+        """
+        Otorga puntos narrativos al usuario (el llamador hace commit)
+        Si el llamador ya tiene el usuario cargado lo pasa en ``user``
+        """
+        if user is None:
+            user = await self.session.get(User, user_id)
         if user:
             user.points += points
-            await self.session.commit()
-
-    async def _record_fragment_visit(self, fragment_id: str) -> None:
-        """Registra la visita a un fragmento para métricas"""
-        # Actualizar métricas de fragment
-        query = select(NarrativeMetrics).where(
-            NarrativeMetrics.fragment_id == fragment_id
-        )
-        result = await self.session.execute(query)
-        metrics = result.scalar_one_or_none()
-        
-        if not metrics:
-            metrics = NarrativeMetrics(
-                fragment_id=fragment_id,
-                times_visited=1
-            )
-            self.session.add(metrics)
-        else:
-            metrics.times_visited += 1
-        
-        await self.session.commit()
-
-    async def _record_choice_metric(self, fragment_id: str, choice_id: str) -> None:
-        """Registra una elección para métricas"""
-        query = select(NarrativeMetrics).where(
-            NarrativeMetrics.fragment_id == fragment_id
-        )
-        result = await self.session.execute(query)
-        metrics = result.scalar_one_or_none()
-        
-        if not metrics:
-            metrics = NarrativeMetrics(
-                fragment_id=fragment_id,
-                choice_distribution={choice_id: 1}
-            )
-            self.session.add(metrics)
-        else:
-            if not metrics.choice_distribution:
-                metrics.choice_distribution = {}
-            current_count = metrics.choice_distribution.get(choice_id, 0)
-            metrics.choice_distribution[choice_id] = current_count + 1
-        
-        await self.session.commit()
-
-    async def _create_checkpoint(self, user_id: int, state: UserNarrativeState) -> None:
-        """Crea un checkpoint del estado actual"""
-        # Simple implementación: actualizar el timestamp de last_interaction
-        state.last_interaction_at = datetime.utcnow()
-        await self.session.commit()
@@ -19,12 +19,12 @@ class ChoiceSchema(BaseModel):
 
 
 class RewardSchema(BaseModel):
-    """Esquema para recompensas de fragmento"""
-    points: Optional[float] = 0
-    items: Optional[List[str]] = Field(default_factory=list)
-    achievements: Optional[List[str]] = Field(default_factory=list)
-    lore_pieces: Optional[List[str]] = Field(default_factory=list)
-    unlock_fragments: Optional[List[str]] = Field(default_factory=list)
+    """Esquema para recompensas de fragmento (todos los campos con valor por defecto)"""
+    points: float = 0
+    items: List[str] = Field(default_factory=list)
+    achievements: List[str] = Field(default_factory=list)
+    lore_pieces: List[str] = Field(default_factory=list)
+    unlock_fragments: List[str] = Field(default_factory=list)
 
 
 class FragmentSchema(BaseModel):
@@ -0,0 +1,68 @@
+"""
+Caché en proceso del estado narrativo por usuario
+Guarda instantáneas de solo lectura (no objetos ORM, que pertenecen a una
+sesión) para que decoradores y menús no consulten la base de datos en cada
+acción. NarrativeService la actualiza tras cada commit que modifica el estado
+"""
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from .constants import STATE_CACHE_MAXSIZE, STATE_CACHE_TTL
+from .models import UserNarrativeState
+
+
+@dataclass(frozen=True)
+class NarrativeStateSnapshot:
+    """Copia inmutable de los campos de UserNarrativeState usados en lectura"""
+    user_id: int
+    active_story: Optional[str]
+    current_fragment_id: Optional[str]
+    current_chapter: int
+    fragments_visited_count: int
+    story_completion_percent: float
+
+    @classmethod
+    def from_state(cls, state: UserNarrativeState) -> "NarrativeStateSnapshot":
+        return cls(
+            user_id=state.user_id,
+            active_story=state.active_story,
+            current_fragment_id=state.current_fragment_id,
+            current_chapter=state.current_chapter or 1,
+            fragments_visited_count=len(state.fragments_visited or []),
+            story_completion_percent=state.story_completion_percent or 0.0,
+        )
+
+
+class NarrativeStateCache:
+    """LRU con caducidad; las operaciones no ceden el event loop, sin lock"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()  # user_id -> (expires_at, snapshot)
+
+    def get(self, user_id: int) -> Optional[NarrativeStateSnapshot]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self._entries[user_id]
+            return None
+        self._entries.move_to_end(user_id)
+        return entry[1]
+
+    def put(self, state: UserNarrativeState) -> NarrativeStateSnapshot:
+        snapshot = NarrativeStateSnapshot.from_state(state)
+        self._entries[state.user_id] = (time.monotonic() + self.ttl, snapshot)
+        self._entries.move_to_end(state.user_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return snapshot
+
+    def invalidate(self, user_id: int) -> None:
+        self._entries.pop(user_id, None)
+
+
+state_cache = NarrativeStateCache(maxsize=STATE_CACHE_MAXSIZE, ttl=STATE_CACHE_TTL)
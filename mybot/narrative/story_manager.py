@@ -4,6 +4,7 @@ Gestor de historias y contenido narrativo
 from __future__ import annotations
 import json
 import logging
+from functools import lru_cache
 from pathlib import Path
 from typing import Dict, List, Optional, Any, Tuple, TYPE_CHECKING
 from datetime import datetime
@@ -30,6 +31,12 @@ class StoryManager:
         self.data_path = data_path or Path(__file__).parent / "data"
         self.stories: Dict[str, StorySchema] = {}
         self._story_cache: Dict[str, Dict[str, FragmentSchema]] = {}
+        # Conjuntos de IDs por historia, calculados una vez al cargar
+        self._fragment_id_set: Dict[str, frozenset] = {}
+        self._main_fragment_id_set: Dict[str, frozenset] = {}
+        # Índices planos para búsquedas O(1) en el camino caliente
+        self._fragment_index: Dict[Tuple[str, str], FragmentSchema] = {}
+        self._choice_index: Dict[Tuple[str, str, str], ChoiceSchema] = {}
         self._load_stories()
     
     def _load_stories(self) -> None:
@@ -53,6 +60,17 @@ class StoryManager:
                             frag_id: FragmentSchema(**frag_data)
                             for frag_id, frag_data in data['fragments'].items()
                         }
+                        fragments = self._story_cache[story_id]
+                        self._fragment_id_set[story_id] = frozenset(fragments)
+                        self._main_fragment_id_set[story_id] = frozenset(
+                            frag_id for frag_id, frag in fragments.items()
+                            if not frag.is_hidden
+                        )
+                        for frag_id, fragment in fragments.items():
+                            self._fragment_index[(story_id, frag_id)] = fragment
+                            for choice in fragment.choices or []:
+                                # La primera opción con un id dado gana, como en el recorrido lineal
+                                self._choice_index.setdefault((story_id, frag_id, choice.id), choice)
                         
                         logger.info(f"Historia '{story_id}' cargada: {story.total_fragments} fragmentos")
                 except Exception as e:
@@ -66,9 +84,11 @@ class StoryManager:
     
     def get_fragment(self, story_id: str, fragment_id: str) -> Optional[FragmentSchema]:
         """Obtiene un fragmento específico"""
-        if story_id in self._story_cache:
-            return self._story_cache[story_id].get(fragment_id)
-        return None
+        return self._fragment_index.get((story_id, fragment_id))
+    
+    def get_fragment_ids(self, story_id: str) -> frozenset:
+        """Obtiene el conjunto de IDs de fragmentos de una historia"""
+        return self._fragment_id_set.get(story_id, frozenset())
     
     def get_starting_fragment(self, story_id: str) -> Optional[FragmentSchema]:
         """Obtiene el fragmento inicial de una historia"""
@@ -88,12 +108,7 @@ class StoryManager:
     
     def validate_choice(self, story_id: str, fragment_id: str, choice_id: str) -> Optional[ChoiceSchema]:
         """Valida que una elección existe en un fragmento"""
-        fragment = self.get_fragment(story_id, fragment_id)
-        if fragment and fragment.choices:
-            for choice in fragment.choices:
-                if choice.id == choice_id:
-                    return choice
-        return None
+        return self._choice_index.get((story_id, fragment_id, choice_id))
     
     def check_requirements(self, requirements: Dict[str, Any], user_data: Dict[str, Any]) -> Tuple[bool, List[str]]:
         """
@@ -140,10 +155,7 @@ class StoryManager:
             return 0.0
         
         # Contar solo fragmentos principales (no ocultos)
-        main_fragments = [
-            frag_id for frag_id, frag in self._story_cache[story_id].items()
-            if not frag.is_hidden
-        ]
+        main_fragments = self._main_fragment_id_set.get(story_id, frozenset())
         
         if not main_fragments:
             return 0.0
@@ -217,3 +229,9 @@ class StoryManager:
         explore(fragment_id, [], depth)
         return paths
               
+
+
+@lru_cache(maxsize=None)
+def get_story_manager() -> StoryManager:
+    """Instancia compartida: las historias se leen del disco una sola vez"""
+    return StoryManager()
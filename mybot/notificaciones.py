@@ -1,6 +1,15 @@
+import asyncio
+import logging
 import random
+from collections import OrderedDict
+from typing import Iterable
 from aiogram import Bot
 
+logger = logging.getLogger(__name__)
+
+# Envíos simultáneos como máximo en broadcast (margen frente a los límites de Telegram)
+BROADCAST_CONCURRENCY = 30
+
 lucien_mensajes = [
     "Sabías que los flamencos pueden dormir mientras están de pie? Lucien aprueba.",
     "Lucien dice: No te fíes de los patos, ellos siempre están tramando algo.",
@@ -14,16 +23,75 @@ lucien_mensajes = [
     "¿Ya tomaste agua? Lucien está pendiente de ti."
 ]
 
-user_last_message = {}
+# Índice del último mensaje enviado a cada usuario. Acotado (LRU) para que
+# no crezca con cada usuario visto mientras el bot sigue en marcha
+USER_LAST_INDEX_MAXSIZE = 100_000
+user_last_index: "OrderedDict[int, int]" = OrderedDict()
+
+
+def _remember_last_index(user_id: int, index: int) -> None:
+    user_last_index[user_id] = index
+    user_last_index.move_to_end(user_id)
+    if len(user_last_index) > USER_LAST_INDEX_MAXSIZE:
+        user_last_index.popitem(last=False)
 
 async def enviar_notificacion_gamificada(bot: Bot, user_id: int):
-    mensaje = random.choice(lucien_mensajes)
+    # Un solo sorteo sin repetir el anterior: se elige entre n-1 índices
+    # y se salta el previo
+    n = len(lucien_mensajes)
+    prev = user_last_index.get(user_id, -1)
+    if n > 1 and prev >= 0:
+        i = random.randrange(n - 1)
+        if i >= prev:
+            i += 1
+    else:
+        i = random.randrange(n)
 
-    while user_last_message.get(user_id) == mensaje and len(lucien_mensajes) > 1:
-        mensaje = random.choice(lucien_mensajes)
+    _remember_last_index(user_id, i)
+    await bot.send_message(user_id, f"💬 {lucien_mensajes[i]}")
 
-    user_last_message[user_id] = mensaje
-    await bot.send_message(user_id, f"💬 {mensaje}")
+
+async def broadcast(bot: Bot, user_ids: Iterable[int]) -> int:
+    """
+    Envía la notificación gamificada a varios usuarios en paralelo,
+    con como máximo BROADCAST_CONCURRENCY envíos en curso.
+    Un fallo con un usuario no interrumpe al resto.
+    Returns: número de notificaciones enviadas
+    """
+    semaphore = asyncio.Semaphore(BROADCAST_CONCURRENCY)
+
+    async def _send_one(user_id: int) -> None:
+        async with semaphore:
+            await enviar_notificacion_gamificada(bot, user_id)
+
+    user_ids = list(user_ids)
+    results = await asyncio.gather(
+        *(_send_one(user_id) for user_id in user_ids),
+        return_exceptions=True,
+    )
+    sent = 0
+    for user_id, result in zip(user_ids, results):
+        if isinstance(result, Exception):
+            logger.warning("Failed to notify user %s: %s", user_id, result)
+        else:
+            sent += 1
+    return sent
+
+
+# Plantillas de notificaciones narrativas; solo se formatea la elegida
+_HINT_TEMPLATES = (
+    "🎩 Lucien: Una nueva pieza ha caído en tus manos... {code}. No la pierdas.",
+    "🎩 Lucien: {code} se ha revelado para ti. ¿Podrás entender su verdadero valor?",
+    "🎩 Lucien: Has desbloqueado algo nuevo. {code}... interesante.",
+    "🎩 Lucien: El Diván susurra: {code} es ahora tuyo.",
+    "🎩 Lucien: {code} proviene de {source}. ¿Accidente o destino?",
+)
+# Fallback para compatibilidad: solo las dos primeras plantillas de pista
+_FALLBACK_HINT_TEMPLATES = _HINT_TEMPLATES[:2]
+_ACHIEVEMENT_TEMPLATES = (
+    "🏆 Lucien: Has desbloqueado un logro: {name}. Diana está impresionada.",
+    "🏆 Lucien: {name}... un logro digno de reconocimiento.",
+)
 
 
 async def send_narrative_notification(bot: Bot, user_id: int, notification_type: str, context: dict = None):
@@ -40,44 +108,25 @@ async def send_narrative_notification(bot: Bot, user_id: int, notification_type:
         context = {}
     
     if notification_type == "new_hint":
-        pista_code = context.get('hint_code', 'Desconocida')
-        origen = context.get('source', 'Sistema')
-        
-        mensajes = [
-            f"🎩 Lucien: Una nueva pieza ha caído en tus manos... {pista_code}. No la pierdas.",
-            f"🎩 Lucien: {pista_code} se ha revelado para ti. ¿Podrás entender su verdadero valor?",
-            f"🎩 Lucien: Has desbloqueado algo nuevo. {pista_code}... interesante.",
-            f"🎩 Lucien: El Diván susurra: {pista_code} es ahora tuyo.",
-            f"🎩 Lucien: {pista_code} proviene de {origen}. ¿Accidente o destino?"
-        ]
+        mensaje = random.choice(_HINT_TEMPLATES).format(
+            code=context.get('hint_code', 'Desconocida'),
+            source=context.get('source', 'Sistema'),
+        )
     elif notification_type == "achievement":
-        achievement_name = context.get('achievement_name', 'Logro desconocido')
-        mensajes = [
-            f"🏆 Lucien: Has desbloqueado un logro: {achievement_name}. Diana está impresionada.",
-            f"🏆 Lucien: {achievement_name}... un logro digno de reconocimiento.",
-        ]
+        mensaje = random.choice(_ACHIEVEMENT_TEMPLATES).format(
+            name=context.get('achievement_name', 'Logro desconocido'),
+        )
     else:
         # Fallback para compatibilidad con código anterior
-        pista_code = str(notification_type)  # Asumir que es el código de pista
-        origen = context.get('source', 'Sistema')
-        mensajes = [
-            f"🎩 Lucien: Una nueva pieza ha caído en tus manos... {pista_code}. No la pierdas.",
-            f"🎩 Lucien: {pista_code} se ha revelado para ti. ¿Podrás entender su verdadero valor?",
-        ]
-
-    mensaje = random.choice(mensajes)
+        mensaje = random.choice(_FALLBACK_HINT_TEMPLATES).format(
+            code=str(notification_type),  # Asumir que es el código de pista
+            source=context.get('source', 'Sistema'),
+        )
+
     await bot.send_message(user_id, mensaje)
 
 # Función de compatibilidad para código existente
 async def send_narrative_notification_legacy(bot: Bot, user_id: int, pista_code: str, origen: str = "Sistema"):
     """Función de compatibilidad para el código existente"""
-    mensajes = [
-        f"🎩 Lucien: Una nueva pieza ha caído en tus manos... {pista_code}. No la pierdas.",
-        f"🎩 Lucien: {pista_code} se ha revelado para ti. ¿Podrás entender su verdadero valor?",
-        f"🎩 Lucien: Has desbloqueado algo nuevo. {pista_code}... interesante.",
-        f"🎩 Lucien: El Diván susurra: {pista_code} es ahora tuyo.",
-        f"🎩 Lucien: {pista_code} proviene de {origen}. ¿Accidente o destino?"
-    ]
-
-    mensaje = random.choice(mensajes)
+    mensaje = random.choice(_HINT_TEMPLATES).format(code=pista_code, source=origen)
     await bot.send_message(user_id, mensaje)
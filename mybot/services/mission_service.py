@@ -1,6 +1,8 @@
 # services/mission_service.py
+import asyncio
 import datetime
 import random
+import time
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, update
 from database.models import (
@@ -20,33 +22,131 @@ logger = logging.getLogger(__name__)
 # Placeholder structure for future missions
 MISSION_PLACEHOLDER: list = []
 
+# Seconds an active-missions query result is shared between callers
+ACTIVE_MISSIONS_CACHE_TTL = 30
+
+
+class _LoadCancelled(Exception):
+    """Raised to waiters when the task loading their key was cancelled."""
+
+
+class _ActiveMissionsCache:
+    """
+    In-process TTL cache for the active missions query.
+    Concurrent misses for the same key share a single in-flight load.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries: dict = {}  # key -> (expires_at, missions)
+        self._pending: dict = {}  # key -> Future
+        self._lock = asyncio.Lock()
+        self._generation = 0
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+        return None
+
+    async def get(self, key, loader) -> list[Mission]:
+        while True:
+            missions = self._lookup(key)
+            if missions is not None:
+                return missions
+
+            async with self._lock:
+                missions = self._lookup(key)
+                if missions is not None:
+                    return missions
+                future = self._pending.get(key)
+                is_owner = future is None
+                if is_owner:
+                    future = asyncio.get_running_loop().create_future()
+                    self._pending[key] = future
+                    generation = self._generation
+
+            if is_owner:
+                break
+            try:
+                # Shielded so a cancelled waiter leaves the shared load alone
+                return await asyncio.shield(future)
+            except _LoadCancelled:
+                continue  # The owner was cancelled, not us: retry the load
+
+        try:
+            missions = await loader()
+        except asyncio.CancelledError:
+            # Waiters retry instead of inheriting this task's cancellation
+            future.set_exception(_LoadCancelled())
+            future.exception()  # Mark as retrieved when nobody is waiting
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            self._pending.pop(key, None)
+
+        # Skip storing results loaded before an invalidation
+        if generation == self._generation:
+            self._entries[key] = (time.monotonic() + self.ttl, missions)
+        future.set_result(missions)
+        return missions
+
+    def invalidate(self) -> None:
+        self._generation += 1
+        self._entries.clear()
+
+
+_active_missions_cache = _ActiveMissionsCache(ACTIVE_MISSIONS_CACHE_TTL)
+
+
 class MissionService:
     def __init__(self, session: AsyncSession):
         self.session = session
         from services.point_service import PointService
         self.point_service = PointService(session)
 
-    async def get_active_missions(self, user_id: int = None, mission_type: str = None) -> list[Mission]:
-        """
-        Retrieves active missions, optionally filtered by user completion status and type.
-        """
+    @staticmethod
+    def invalidate_active_cache() -> None:
+        """Drops cached active missions so the next read hits the database."""
+        _active_missions_cache.invalidate()
+
+    async def _load_active_missions(self, mission_type: str = None) -> list[Mission]:
         stmt = select(Mission).where(Mission.is_active == True)
         if mission_type:
             stmt = stmt.where(Mission.type == mission_type)
         result = await self.session.execute(stmt)
-        missions = [m for m in result.scalars().all() if not m.duration_days or (m.created_at + datetime.timedelta(days=m.duration_days)) > datetime.datetime.utcnow()]
+        missions = list(result.scalars().all())
+        # Cached instances are shared across sessions: detach them so a
+        # rollback or expire on this session cannot invalidate them
+        for mission in missions:
+            self.session.expunge(mission)
+        return missions
 
-        if user_id: # Filter out completed missions for a specific user based on reset rules
-            user = await self.session.get(User, user_id)
+    async def get_active_missions(
+        self,
+        user_id: int = None,
+        mission_type: str = None,
+        *,
+        user: User | None = None,
+    ) -> list[Mission]:
+        """
+        Retrieves active missions, optionally filtered by user completion status and type.
+        An already loaded ``user`` can be passed to skip fetching it again.
+        """
+        active = await _active_missions_cache.get(
+            mission_type, lambda: self._load_active_missions(mission_type)
+        )
+        missions = [m for m in active if not m.duration_days or (m.created_at + datetime.timedelta(days=m.duration_days)) > datetime.datetime.utcnow()]
+
+        if user_id or user: # Filter out completed missions for a specific user based on reset rules
+            if user is None:
+                user = await self.session.get(User, user_id)
             if user:
-                filtered_missions = []
-                now = datetime.datetime.now()
-
-                for mission in missions:
-                    is_completed_for_period, _ = await self.check_mission_completion_status(user, mission)
-                    if not is_completed_for_period:
-                        filtered_missions.append(mission)
-                return filtered_missions
+                statuses = await self.get_completion_statuses(user, missions)
+                return [mission for mission in missions if not statuses[mission.id]]
         return missions
 
     async def get_daily_active_missions(self, user_id: int | None = None) -> list[Mission]:
@@ -62,26 +162,43 @@ class MissionService:
         or if it's a one-time mission already completed.
         Returns (is_completed_for_period, reason_if_completed)
         """
-        mission_completion_record = user.missions_completed.get(mission.id)
-        
+        return self._completion_status(
+            mission, user.missions_completed.get(mission.id), datetime.datetime.now()
+        )
+
+    async def get_completion_statuses(self, user: User, missions: list[Mission]) -> dict[str, bool]:
+        """
+        Returns {mission_id: is_completed_for_period} for all given missions.
+        Completion records live in ``user.missions_completed``, so the check is
+        evaluated in memory against the already loaded user row.
+        """
+        records = user.missions_completed or {}
+        now = datetime.datetime.now()
+        return {
+            m.id: self._completion_status(m, records.get(m.id), now)[0]
+            for m in missions
+        }
+
+    @staticmethod
+    def _completion_status(mission: Mission, mission_completion_record: str | None, now: datetime.datetime) -> tuple[bool, str]:
+        """Pure completion predicate shared by the single and batch checks."""
+        if not mission_completion_record:
+            return False, ""
+
         if mission.type == "one_time":
-            if mission_completion_record:
-                return True, "already_completed"
+            return True, "already_completed"
         elif mission.type == "daily":
-            if mission_completion_record:
-                last_completed = datetime.datetime.fromisoformat(mission_completion_record)
-                if (datetime.datetime.now() - last_completed) < datetime.timedelta(days=1):
-                    return True, "daily_limit_reached"
+            last_completed = datetime.datetime.fromisoformat(mission_completion_record)
+            if (now - last_completed) < datetime.timedelta(days=1):
+                return True, "daily_limit_reached"
         elif mission.type == "weekly":
-            if mission_completion_record:
-                last_completed = datetime.datetime.fromisoformat(mission_completion_record)
-                if (datetime.datetime.now() - last_completed) < datetime.timedelta(weeks=1):
-                    return True, "weekly_limit_reached"
+            last_completed = datetime.datetime.fromisoformat(mission_completion_record)
+            if (now - last_completed) < datetime.timedelta(weeks=1):
+                return True, "weekly_limit_reached"
         elif mission.type == "reaction":
             # For reaction missions, check if already completed once
-            if mission_completion_record:
-                return True, "already_completed"
-        
+            return True, "already_completed"
+
         return False, "" # Not completed for current period or not a one-time mission
 
     async def complete_mission(
@@ -101,13 +218,13 @@ class MissionService:
         mission = await self.session.get(Mission, mission_id)
 
         if not user or not mission or not mission.is_active:
-            logger.warning(f"Failed to complete mission: User {user_id} or mission {mission_id} not found or inactive.")
+            logger.warning("Failed to complete mission: User %s or mission %s not found or inactive.", user_id, mission_id)
             return False, None
 
         # Check if already completed for the current period
         is_completed, reason = await self.check_mission_completion_status(user, mission, target_message_id)
         if is_completed:
-            logger.info(f"User {user_id} attempted to complete mission {mission_id} but it was already completed ({reason}).")
+            logger.info("User %s attempted to complete mission %s but it was already completed (%s).", user_id, mission_id, reason)
             return False, None
 
         # Add mission to user's completed list with timestamp
@@ -148,7 +265,7 @@ class MissionService:
                 if not exists:
                     self.session.add(UserLorePiece(user_id=user_id, lore_piece_id=lore_piece.id))
                     logger.info(
-                        f"User {user_id} unlocked lore piece {unlock_code} via mission {mission_id}"
+                        "User %s unlocked lore piece %s via mission %s", user_id, unlock_code, mission_id
                     )
 
         # Ensure JSON field updates are marked for SQLAlchemy
@@ -169,7 +286,8 @@ class MissionService:
             )
 
         logger.info(
-            f"User {user_id} successfully completed mission {mission_id} (Type: {mission.type}, Message: {target_message_id})."
+            "User %s successfully completed mission %s (Type: %s, Message: %s).",
+            user_id, mission_id, mission.type, target_message_id,
         )
         return True, mission
 
@@ -200,6 +318,7 @@ class MissionService:
         )
         self.session.add(new_mission)
         await self.session.commit()
+        self.invalidate_active_cache()
         await self.session.refresh(new_mission)
         return new_mission
 
@@ -208,9 +327,24 @@ class MissionService:
         if mission:
             mission.is_active = status
             await self.session.commit()
+            self.invalidate_active_cache()
             return True
         return False
 
+    async def get_mission_entries(self, user_id: int, mission_ids: list[str]) -> dict[str, UserMissionEntry]:
+        """
+        Loads the user's progress rows for all given missions in a single query.
+        Missions without a row are absent from the returned dict.
+        """
+        if not mission_ids:
+            return {}
+        stmt = select(UserMissionEntry).where(
+            UserMissionEntry.user_id == user_id,
+            UserMissionEntry.mission_id.in_(mission_ids),
+        )
+        result = await self.session.execute(stmt)
+        return {entry.mission_id: entry for entry in result.scalars().all()}
+
     async def update_progress(
         self,
         user_id: int,
@@ -221,13 +355,9 @@ class MissionService:
         bot=None,
     ) -> None:
         missions = await self.get_active_missions(mission_type=mission_type)
+        entries = await self.get_mission_entries(user_id, [m.id for m in missions])
         for mission in missions:
-            stmt = select(UserMissionEntry).where(
-                UserMissionEntry.user_id == user_id,
-                UserMissionEntry.mission_id == mission.id,
-            )
-            result = await self.session.execute(stmt)
-            record = result.scalar_one_or_none()
+            record = entries.get(mission.id)
             if not record:
                 record = UserMissionEntry(user_id=user_id, mission_id=mission.id)
                 self.session.add(record)
@@ -262,6 +392,7 @@ class MissionService:
         if mission:
             await self.session.delete(mission)
             await self.session.commit()
+            self.invalidate_active_cache()
             return True
         return False
 
@@ -40,6 +40,13 @@ FREE_CHANNEL_ID = int(os.environ.get("FREE_CHANNEL_ID", "0"))
 CHANNEL_SCHEDULER_INTERVAL = int(os.environ.get("CHANNEL_SCHEDULER_INTERVAL", "30"))
 VIP_SCHEDULER_INTERVAL = int(os.environ.get("VIP_SCHEDULER_INTERVAL", "3600"))
 
+# Number of database connections kept open by the engine pool. Reusing
+# long-lived connections avoids reconnecting on every update and keeps
+# SQLite's page cache warm between queries.
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "20"))
+# Extra connections allowed on top of the pool during bursts.
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "10"))
+
 # Default reaction button texts used on channel posts when no custom values
 
 # are configured via the admin settings menu. They should be provided as a
@@ -55,3 +62,5 @@ class Config:
     DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///gamification.db")
     CHANNEL_SCHEDULER_INTERVAL = CHANNEL_SCHEDULER_INTERVAL
     VIP_SCHEDULER_INTERVAL = VIP_SCHEDULER_INTERVAL
+    DB_POOL_SIZE = DB_POOL_SIZE
+    DB_MAX_OVERFLOW = DB_MAX_OVERFLOW
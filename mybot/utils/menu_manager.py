@@ -4,6 +4,7 @@ Handles message lifecycle, navigation state, and prevents chat clutter.
 """
 import asyncio
 import logging
+from collections import OrderedDict
 from typing import Dict, Optional, Tuple, Any
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup
 from utils.message_safety import (
@@ -18,6 +19,9 @@ from database.models import User, set_user_menu_state
 
 logger = logging.getLogger(__name__)
 
+# Bound (LRU) on remembered menu bodies so they don't grow with every user seen
+MENU_BODIES_MAXSIZE = 100_000
+
 class MenuManager:
     """
     Centralized menu management system that ensures clean chat experience.
@@ -33,6 +37,8 @@ class MenuManager:
         self._temp_messages: Dict[int, Tuple[int, int, float]] = {}  # user_id -> (chat_id, message_id, expire_time)
         # Navigation history for back button functionality
         self._nav_history: Dict[int, list] = {}  # user_id -> [menu_states]
+        # Body rendered by the last update_menu call, to skip resending unchanged text
+        self._menu_bodies: "OrderedDict[int, Tuple[int, int, Any]]" = OrderedDict()  # user_id -> (message_id, body_hash, edit_date)
     
     async def show_menu(
         self, 
@@ -140,13 +146,20 @@ class MenuManager:
         # Clean up any temporary messages
         await self._cleanup_temp_messages(bot, user_id)
         
+        body_hash = hash((text, parse_mode))
+        
         try:
-            await safe_edit(
-                message,
-                text,
-                reply_markup=keyboard,
-                parse_mode=parse_mode,
-            )
+            if self._is_same_body(user_id, message, body_hash):
+                # Only the buttons change: cheaper than re-sending the whole text
+                result = await message.edit_reply_markup(reply_markup=keyboard)
+            else:
+                result = await safe_edit(
+                    message,
+                    text,
+                    reply_markup=keyboard,
+                    parse_mode=parse_mode,
+                )
+            self._remember_body(user_id, message, body_hash, result)
             
             # Update stored menu reference - this is crucial to ensure _active_menus points to the correct message
             self._active_menus[user_id] = (message.chat.id, message.message_id) # Corregido de message.message.id a message.message_id
@@ -165,6 +178,28 @@ class MenuManager:
             logger.error(f"Error updating menu for user {user_id}: {e}")
             return False
     
+    def _is_same_body(self, user_id: int, message: Message, body_hash: int) -> bool:
+        """
+        True if the message still shows the text of our last update.
+        The edit date guards against edits made outside the menu manager.
+        """
+        stored = self._menu_bodies.get(user_id)
+        if not stored:
+            return False
+        edit_date = getattr(message, "edit_date", None)
+        return edit_date is not None and stored == (message.message_id, body_hash, edit_date)
+    
+    def _remember_body(self, user_id: int, message: Message, body_hash: int, result: Any) -> None:
+        """Store the rendered body, or forget it if the edit date is unknown."""
+        edit_date = getattr(result, "edit_date", None)
+        if edit_date is None:
+            self._menu_bodies.pop(user_id, None)
+        else:
+            self._menu_bodies[user_id] = (message.message_id, body_hash, edit_date)
+            self._menu_bodies.move_to_end(user_id)
+            if len(self._menu_bodies) > MENU_BODIES_MAXSIZE:
+                self._menu_bodies.popitem(last=False)
+    
     async def send_temporary_message(
         self,
         message: Message,
@@ -255,6 +290,7 @@ class MenuManager:
         
         # Clear navigation history
         self._nav_history.pop(user_id, None)
+        self._menu_bodies.pop(user_id, None)
     
     def _update_nav_history(self, user_id: int, menu_state: str) -> None:
         """Update navigation history for back button functionality."""